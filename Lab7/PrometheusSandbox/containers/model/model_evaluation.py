@@ -1,8 +1,11 @@
 import os
+import math
 import time
 import datetime
 import logging
-from prometheus_api_client import PrometheusConnect
+from lab7_common.prom_client import PrometheusClient, values_to_arrays
+from lab7_common.intervals import INTERVAL_METHODS, IntervalForecaster, interval_coverage
+from lab7_common.sample_store import SampleStore
 import pandas as pd
 from prophet import Prophet
 from prometheus_client import Gauge, start_http_server, REGISTRY
@@ -11,40 +14,84 @@ from prometheus_client.exposition import ThreadingWSGIServer
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# samples: Prophet's simulated interval, analytic: Gaussian on training residuals, conformal: split-conformal
+INTERVAL_METHOD = os.getenv('INTERVAL_METHOD', 'samples')
+UNCERTAINTY_SAMPLES = int(os.getenv('UNCERTAINTY_SAMPLES', '1000'))
+if INTERVAL_METHOD not in INTERVAL_METHODS:
+    raise ValueError(f"INTERVAL_METHOD must be one of {', '.join(INTERVAL_METHODS)}, got {INTERVAL_METHOD!r}")
+# Local sample store: each loop then only fetches the samples newer than the ones already stored
+SAMPLE_STORE_DIR = os.getenv('SAMPLE_STORE_DIR')
+
 
 def prometheus_connection(url):
     """Connect to Prometheus server"""
-    return PrometheusConnect(url, disable_ssl=True)
+    return PrometheusClient(url)
 
 
 def fetch_metrics(prom, metric_name, start_time, end_time):
-    """Fetch the data from Prometheus server"""
-    metric_data = prom.get_metric_range_data(metric_name, start_time=start_time, end_time=end_time)
+    """Fetch the raw samples of a metric between start_time and end_time from Prometheus server"""
+    window = int((end_time - start_time).total_seconds())
+    metric_data = prom.query(f'{metric_name}[{window}s]', time=end_time.timestamp())
     if not metric_data or 'values' not in metric_data[0]:
         logging.error(f"No data found for metric {metric_name}")
         return pd.DataFrame(columns=['ds', 'y'])
 
-    df = pd.DataFrame(metric_data[0]['values'], columns=['ds', 'y'])
-    df['ds'] = pd.to_datetime(df['ds'], unit='s')
+    timestamps, values = values_to_arrays(metric_data[0]['values'])
+    df = pd.DataFrame({'ds': pd.to_datetime(timestamps, unit='s'), 'y': values})
     logging.info(f"Fetched data for {metric_name}: {df.head()}")
     return df
 
 
+def fetch_metrics_stored(prom, store, metric_name, start_time, end_time):
+    """Same as fetch_metrics, querying Prometheus only for what the sample store does not hold yet"""
+    start, end = start_time.timestamp(), end_time.timestamp()
+    last = store.last_timestamp(metric_name)
+    fetch_start = start if last is None or last < start else last
+    window = math.ceil(end - fetch_start)
+    if window > 0:
+        metric_data = prom.query(f'{metric_name}[{window}s]', time=end)
+        if metric_data and 'values' in metric_data[0]:
+            added = store.append(metric_name, *values_to_arrays(metric_data[0]['values']))
+            logging.info(f"Fetched {window}s of {metric_name}, {added} new samples stored")
+
+    timestamps, values = store.read(metric_name, start, end)
+    if not len(timestamps):
+        logging.error(f"No data found for metric {metric_name}")
+        return pd.DataFrame(columns=['ds', 'y'])
+    df = pd.DataFrame({'ds': pd.to_datetime(timestamps, unit='s'), 'y': values})
+    logging.info(f"Read data for {metric_name}: {df.head()}")
+    return df
+
+
 def evaluate_model(train_data, test_data):
     """Train and evaluate the prophet model"""
     if train_data.dropna().shape[0] < 2:
         raise ValueError("Training data has less than 2 non-NaN rows.")
 
-    model = Prophet(interval_width=0.99, growth='flat', yearly_seasonality=False, weekly_seasonality=False,
-                    daily_seasonality=False)
+    prophet_model = Prophet(interval_width=0.99, growth='flat', yearly_seasonality=False, weekly_seasonality=False,
+                            daily_seasonality=False,
+                            uncertainty_samples=UNCERTAINTY_SAMPLES if INTERVAL_METHOD == 'samples' else 0)
+    model = prophet_model
+    if INTERVAL_METHOD != 'samples':
+        model = IntervalForecaster(prophet_model, INTERVAL_METHOD, 0.99)
     model.fit(train_data)
-    future = model.make_future_dataframe(periods=len(test_data), freq='s')
+    # Same rows as make_future_dataframe, built from all of train_data since a conformal fit only sees part of it
+    last = train_data['ds'].max()
+    future = pd.DataFrame({'ds': pd.concat([train_data['ds'],
+                                            pd.Series(pd.date_range(last, periods=len(test_data) + 1, freq='s')[1:])],
+                                           ignore_index=True)})
+    start = time.perf_counter()
     forecast = model.predict(future)
+    elapsed = time.perf_counter() - start
     test_data = test_data.rename(columns={'ds': 'timestamp', 'y': 'value'})
     test_data['value'] = pd.to_numeric(test_data['value'], errors='coerce')
     forecast['yhat'] = pd.to_numeric(forecast['yhat'], errors='coerce')
-    evaluation = pd.merge(test_data, forecast[['ds', 'yhat']], left_on='timestamp', right_on='ds')
+    evaluation = pd.merge(test_data, forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']],
+                          left_on='timestamp', right_on='ds')
     evaluation['error'] = evaluation['value'] - evaluation['yhat']
+    coverage = interval_coverage(evaluation['value'], evaluation['yhat_lower'], evaluation['yhat_upper'])
+    logging.info(f"Interval {INTERVAL_METHOD}: predict took {elapsed:.3f}s for {len(future)} rows, "
+                 f"test coverage {coverage:.3f}")
     logging.info(f"Evaluation data: {evaluation.head()}")
     return evaluation
 
@@ -72,6 +119,12 @@ def calculate_mae_and_mape(evaluation):
 def main():
     url = os.getenv('PROMETHEUS_URL', 'http://localhost:9090')
     prom = prometheus_connection(url)
+    store = SampleStore(SAMPLE_STORE_DIR, retention=3600) if SAMPLE_STORE_DIR else None
+
+    def fetch(metric_name, start_time, end_time):
+        if store is None:
+            return fetch_metrics(prom, metric_name, start_time, end_time)
+        return fetch_metrics_stored(prom, store, metric_name, start_time, end_time)
 
     # Check if the Prometheus client server is already running
     if not any(isinstance(handler, ThreadingWSGIServer) for handler in REGISTRY._collector_to_names.values()):
@@ -85,7 +138,7 @@ def main():
         end_time = datetime.datetime.now()
         start_time = end_time - datetime.timedelta(minutes=5)
 
-        train_data = fetch_metrics(prom, 'train_gauge', start_time, end_time)
+        train_data = fetch('train_gauge', start_time, end_time)
         if train_data.dropna().shape[0] < 2:
             logging.error("Insufficient training data. Skipping this iteration.")
             continue
@@ -94,7 +147,7 @@ def main():
 
         test_end_time = datetime.datetime.now()
         test_start_time = test_end_time - datetime.timedelta(minutes=1)
-        test_data = fetch_metrics(prom, 'test_gauge', test_start_time, test_end_time)
+        test_data = fetch('test_gauge', test_start_time, test_end_time)
         if test_data.empty:
             logging.error("No test data found. Skipping this iteration.")
             continue
@@ -0,0 +1,42 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+class AsyncPoller:
+    """Runs blocking Prometheus calls concurrently on a bounded pool and scoring off the event loop"""
+
+    def __init__(self, max_concurrency=8, query_timeout=10):
+        self.query_timeout = query_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._io_executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='poller-io')
+        self._cpu_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='poller-cpu')
+
+    async def fetch(self, fn, *args):
+        """Run one blocking fetch, failing with asyncio.TimeoutError after query_timeout seconds"""
+        loop = asyncio.get_running_loop()
+        # The deadline starts once a slot is free, not while the call is still queued
+        await self._semaphore.acquire()
+        future = loop.run_in_executor(self._io_executor, fn, *args)
+        # A timed out call keeps its thread busy until it returns, so its slot is only freed then: otherwise new
+        # fetches would queue behind it in the executor and spend their own deadline waiting for a thread
+        future.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.shield(future), self.query_timeout)
+
+    def _release(self, future):
+        if not future.cancelled():
+            # Retrieved here in case the caller timed out, so asyncio does not log it as never retrieved
+            future.exception()
+        self._semaphore.release()
+
+    async def fetch_all(self, calls):
+        """Run (fn, args) fetches concurrently, returning results or exceptions in call order"""
+        return await asyncio.gather(*(self.fetch(fn, *args) for fn, args in calls),
+                                    return_exceptions=True)
+
+    async def score(self, fn, *args):
+        """Run CPU-bound scoring on the dedicated executor so the event loop stays responsive"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._cpu_executor, fn, *args)
+
+    def close(self):
+        self._io_executor.shutdown(wait=False)
+        self._cpu_executor.shutdown(wait=False)
@@ -0,0 +1,88 @@
+import numpy as np
+
+# Client-side histogram_quantile over classic Prometheus histogram buckets, following
+# bucketQuantile() in promql/quantile.go: buckets are coalesced by upper bound and made monotonic,
+# the +Inf bucket is required, the rank is interpolated linearly inside its bucket, the first bucket
+# starts at 0 (unless its upper bound is <= 0) and ranks in the +Inf bucket return the highest finite bound.
+
+def bucket_quantiles(quantiles, upper_bounds, counts):
+    """histogram_quantile of each quantile for every row of cumulative bucket counts, shape (rows, quantiles)"""
+    quantiles = np.atleast_1d(np.asarray(quantiles, dtype=np.float64))
+    upper_bounds = np.asarray(upper_bounds, dtype=np.float64)
+    counts = np.atleast_2d(np.asarray(counts, dtype=np.float64))
+    rows = counts.shape[0]
+
+    # Coalesce buckets with the same upper bound (e.g. le="1" and le="1.0") and sort them
+    upper_bounds, inverse = np.unique(upper_bounds, return_inverse=True)
+    coalesced = np.zeros((rows, len(upper_bounds)))
+    np.add.at(coalesced.T, inverse, counts.T)
+    if len(upper_bounds) < 2 or upper_bounds[-1] != np.inf:
+        return _special_quantiles(quantiles, np.full((rows, len(quantiles)), np.nan))
+
+    # Rates of cumulative buckets can be slightly non-monotonic when scraped at different times
+    cumulative = np.maximum.accumulate(coalesced, axis=1)
+    total = cumulative[:, -1]
+    rank = total[:, None] * np.clip(quantiles, 0, 1)[None, :]
+
+    # First bucket whose cumulative count reaches the rank, the counts are sorted so this is a count of smaller ones
+    b = (cumulative[:, None, :] < rank[:, :, None]).sum(axis=2)
+    b = np.minimum(b, len(upper_bounds) - 1)
+    row = np.arange(rows)[:, None]
+    previous = np.where(b > 0, cumulative[row, np.maximum(b - 1, 0)], 0.0)
+    start = np.where(b > 0, upper_bounds[np.maximum(b - 1, 0)], 0.0)
+    end = upper_bounds[b]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = start + (end - start) * (rank - previous) / (cumulative[row, b] - previous)
+    result = np.where(b == len(upper_bounds) - 1, upper_bounds[-2], result)
+    result = np.where((b == 0) & (upper_bounds[0] <= 0), upper_bounds[0], result)
+    result = np.where((total > 0)[:, None], result, np.nan)
+    return _special_quantiles(quantiles, result)
+
+def _special_quantiles(quantiles, result):
+    """Prometheus answers -Inf below 0, +Inf above 1 and NaN for a NaN quantile, whatever the buckets"""
+    result = np.where(quantiles < 0, -np.inf, result)
+    result = np.where(quantiles > 1, np.inf, result)
+    return np.where(np.isnan(quantiles), np.nan, result)
+
+def _group(result, by):
+    """Group bucket series by their `by` labels, {group: [(le, series), ...]}"""
+    # A list, not a dict by le: series with equal bounds (le="1" and le="1.0") are all kept for
+    # bucket_quantiles to sum
+    groups = {}
+    for series in result:
+        metric = series['metric']
+        if 'le' not in metric:
+            continue
+        groups.setdefault(tuple(metric.get(label) for label in by), []).append((float(metric['le']), series))
+    return groups
+
+def vector_quantiles(result, quantiles, by=('source_app', 'destination_app')):
+    """Quantiles of an instant vector of bucket rates, {(*group labels, quantile): (timestamp, value)}"""
+    quantiles = [float(q) for q in quantiles]
+    samples = {}
+    for group, buckets in _group(result, by).items():
+        upper_bounds = [le for le, _ in buckets]
+        counts = [float(series['value'][1]) for _, series in buckets]
+        timestamp = max(float(series['value'][0]) for _, series in buckets)
+        for q, value in zip(quantiles, bucket_quantiles(quantiles, upper_bounds, counts)[0]):
+            samples[group + (q,)] = (timestamp, float(value))
+    return samples
+
+def matrix_quantiles(result, quantiles, by=('source_app', 'destination_app')):
+    """Quantiles of a range query of bucket rates, {(*group labels, quantile): (timestamps, values)}"""
+    quantiles = [float(q) for q in quantiles]
+    series_by_group = {}
+    for group, buckets in _group(result, by).items():
+        upper_bounds = [le for le, _ in buckets]
+        timestamps = np.unique(np.concatenate([
+            np.array([float(t) for t, _ in series['values']]) for _, series in buckets]))
+        # A step where a bucket has no sample gives NaN, where Prometheus would drop that bucket instead
+        counts = np.full((len(timestamps), len(upper_bounds)), np.nan)
+        for k, (_, series) in enumerate(buckets):
+            values = series['values']
+            positions = np.searchsorted(timestamps, [float(t) for t, _ in values])
+            counts[positions, k] = [float(v) for _, v in values]
+        values = bucket_quantiles(quantiles, upper_bounds, counts)
+        for j, q in enumerate(quantiles):
+            series_by_group[group + (q,)] = (timestamps, values[:, j])
+    return series_by_group
@@ -0,0 +1,62 @@
+import numpy as np
+
+class RingHistory:
+    """Fixed-capacity, array-backed result history with O(1) append and incremental window sums"""
+
+    def __init__(self, columns, capacity=1440, window=5):
+        if capacity < window:
+            raise ValueError(f"capacity ({capacity}) must be at least the window size ({window})")
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.window = window
+        self._timestamps = np.zeros(capacity, dtype=np.float64)
+        self._values = np.zeros((capacity, len(self.columns)), dtype=np.float64)
+        self._window_sums = np.zeros(len(self.columns), dtype=np.float64)
+        self._window_counts = np.zeros(len(self.columns), dtype=np.int64)
+        self._total = 0
+
+    def __len__(self):
+        return min(self._total, self.capacity)
+
+    def append(self, timestamp, values):
+        """Append one row, evicting the oldest one once the buffer is full"""
+        row = np.asarray(values, dtype=np.float64)
+        if self._total >= self.window:
+            leaving = self._values[(self._total - self.window) % self.capacity]
+            valid = ~np.isnan(leaving)
+            self._window_sums[valid] -= leaving[valid]
+            self._window_counts[valid] -= 1
+
+        i = self._total % self.capacity
+        self._timestamps[i] = timestamp
+        self._values[i] = row
+        valid = ~np.isnan(row)
+        self._window_sums[valid] += row[valid]
+        self._window_counts[valid] += 1
+        self._total += 1
+
+        # Re-derive the running sums once per lap so float rounding cannot accumulate
+        if self._total % self.capacity == 0:
+            window_rows = self._values[self._indices(self.window)]
+            self._window_sums = np.nansum(window_rows, axis=0)
+            self._window_counts = np.sum(~np.isnan(window_rows), axis=0)
+
+    def _indices(self, n):
+        n = min(n, len(self))
+        return np.arange(self._total - n, self._total) % self.capacity
+
+    def tail(self, n=None):
+        """Return the last n rows, oldest first, as (timestamp, values) pairs"""
+        idx = self._indices(len(self) if n is None else n)
+        return [(float(self._timestamps[i]), self._values[i].tolist()) for i in idx]
+
+    def window_sum(self, column):
+        """Sum of a column over the last `window` rows, ignoring NaNs"""
+        return float(self._window_sums[self.columns.index(column)])
+
+    def window_mean(self, column):
+        """Mean of a column over the last `window` rows, ignoring NaNs"""
+        i = self.columns.index(column)
+        if self._window_counts[i] == 0:
+            return float('nan')
+        return float(self._window_sums[i] / self._window_counts[i])
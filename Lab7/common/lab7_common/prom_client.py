@@ -0,0 +1,94 @@
+import json
+import time
+import numpy as np
+import requests
+from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+class PrometheusError(Exception):
+    """Raised when Prometheus answers a query with an error status"""
+
+    def __init__(self, message, status=None, error_type=None):
+        super().__init__(message)
+        self.status = status
+        self.error_type = error_type
+
+def is_transient(error):
+    """Whether a failed call may succeed when retried: connection errors, timeouts and 5xx answers"""
+    # requests' connection and timeout errors do not derive from the builtin ConnectionError and TimeoutError
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+        return True
+    # 4xx answers, bad_data and queries Prometheus cannot execute, fail the same way every time
+    return isinstance(error, PrometheusError) and error.status is not None and error.status >= 500
+
+class PrometheusClient:
+    """Prometheus HTTP API client with a pooled keep-alive session and per-call deadlines"""
+
+    def __init__(self, url, timeout=10, pool_size=10, post_threshold=2048):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.post_threshold = post_threshold
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip', 'Accept': 'application/json'})
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, endpoint, params, timeout=None, stats=None):
+        """Send an API request, switching to POST when the encoded query is too long for a URL"""
+        timeout = self.timeout if timeout is None else timeout
+        # Let Prometheus abandon the evaluation at the same deadline as the client. Plain seconds, as durations
+        # like 10.0s or 9.5s are rejected
+        params = dict(params, timeout=f'{timeout:g}')
+        url = f'{self.url}/api/v1/{endpoint}'
+        start = time.perf_counter()
+        if len(urlencode(params)) > self.post_threshold:
+            response = self.session.post(url, data=params, timeout=timeout)
+        else:
+            response = self.session.get(url, params=params, timeout=timeout)
+        received = time.perf_counter()
+        body = _loads(response.content) if response.content else {}
+        # Optional per-call instrumentation, a dict argument keeps concurrent calls from sharing state
+        if stats is not None:
+            stats.update(seconds=received - start, bytes=len(response.content),
+                         parse_seconds=time.perf_counter() - received)
+        if response.status_code != 200 or body.get('status') != 'success':
+            raise PrometheusError(
+                f"{endpoint} failed with HTTP {response.status_code}: "
+                f"{body.get('errorType', '')} {body.get('error', response.reason)}".strip(),
+                response.status_code, body.get('errorType'))
+        return body['data']
+
+    def query(self, query, time=None, timeout=None, stats=None):
+        """Run an instant query and return its result list"""
+        params = {'query': query}
+        if time is not None:
+            params['time'] = time
+        return self._request('query', params, timeout, stats)['result']
+
+    def query_range(self, query, start, end, step, timeout=None, stats=None):
+        """Run a range query and return its result list"""
+        params = {'query': query, 'start': start, 'end': end, 'step': step}
+        return self._request('query_range', params, timeout, stats)['result']
+
+def values_to_arrays(values):
+    """Convert a Prometheus [[timestamp, "value"], ...] list to float64 timestamp and value arrays"""
+    if not values:
+        return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+    timestamps, samples = zip(*values)
+    return np.array(timestamps, dtype=np.float64), np.array(samples, dtype=np.float64)
+
+def vector_value(result, default=None):
+    """Value of the first sample of an instant vector result, or default if it is empty"""
+    if not result:
+        return default
+    return float(result[0]['value'][1])
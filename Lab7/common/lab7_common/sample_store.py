@@ -0,0 +1,148 @@
+import os
+import re
+import mmap
+import hashlib
+import numpy as np
+
+# Append-only, memory-mapped sample store: one file per series, holding a 64-byte header (magic, capacity,
+# length) followed by `capacity` float64 timestamps and then `capacity` float64 values. The writer fills the
+# next slots and only then bumps the length, so readers (in any process) never see a half-written sample.
+# A full file is rewritten at twice the size, dropping samples older than the retention, and swapped in atomically.
+# Expired samples are never returned by reads, and a file is also rewritten once they make up a quarter of it.
+MAGIC = int.from_bytes(b'LAB7SMP1', 'little')
+HEADER_BYTES = 64
+
+def series_file(directory, name):
+    """File of a series, a readable form of its name plus a hash so different names never share a file"""
+    readable = re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_')[:80]
+    return os.path.join(directory, f"{readable}-{hashlib.sha256(name.encode()).hexdigest()[:8]}.samples")
+
+class _SeriesFile:
+    """Mapping of one series file, the arrays are views into the file's pages"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'r+b') as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self.map = mmap.mmap(f.fileno(), 0)
+        self.header = np.frombuffer(self.map, dtype='<u8', count=3)
+        if int(self.header[0]) != MAGIC:
+            raise ValueError(f"{path} is not a sample store file")
+        self.capacity = int(self.header[1])
+        self.timestamps = np.frombuffer(self.map, dtype='<f8', count=self.capacity, offset=HEADER_BYTES)
+        self.values = np.frombuffer(self.map, dtype='<f8', count=self.capacity,
+                                    offset=HEADER_BYTES + 8 * self.capacity)
+
+    def __len__(self):
+        return int(self.header[2])
+
+    @staticmethod
+    def create(path, capacity, timestamps=(), values=()):
+        """Atomically write a series file holding the given samples"""
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w+b') as f:
+            f.truncate(HEADER_BYTES + 16 * capacity)
+            with mmap.mmap(f.fileno(), 0) as m:
+                header = np.frombuffer(m, dtype='<u8', count=3)
+                header[:] = (MAGIC, capacity, 0)
+                n = len(timestamps)
+                np.frombuffer(m, dtype='<f8', count=n, offset=HEADER_BYTES)[:] = timestamps
+                np.frombuffer(m, dtype='<f8', count=n, offset=HEADER_BYTES + 8 * capacity)[:] = values
+                header[2] = n
+                del header
+                m.flush()
+        os.replace(tmp_path, path)
+
+class SampleStore:
+    """Directory of append-only series files, written by the pollers and read as zero-copy slices"""
+
+    def __init__(self, directory, retention=None, initial_capacity=4096):
+        self.directory = directory
+        self.retention = retention
+        self.initial_capacity = initial_capacity
+        self._series = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _open(self, name, create=False):
+        """Mapping of a series, remapped when another process has swapped in a grown file"""
+        path = series_file(self.directory, name)
+        series = self._series.get(name)
+        try:
+            if series is not None and os.stat(path).st_ino == series.inode:
+                return series
+        except FileNotFoundError:
+            pass
+        if not os.path.exists(path):
+            if not create:
+                return None
+            _SeriesFile.create(path, self.initial_capacity)
+        # The previous mapping is not closed: slices handed out earlier still point into it
+        series = self._series[name] = _SeriesFile(path)
+        return series
+
+    def append(self, name, timestamps, values):
+        """Append samples to a series, ignoring any not newer than its last stored timestamp"""
+        timestamps = np.atleast_1d(np.asarray(timestamps, dtype=np.float64))
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        series = self._open(name, create=True)
+        n = len(series)
+        last = series.timestamps[n - 1] if n else -np.inf
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, values = timestamps[order], values[order]
+        # Keep strictly increasing timestamps, so reads can binary search and overlapping fetches dedupe
+        keep = timestamps > np.maximum.accumulate(np.concatenate(([last], timestamps[:-1])))
+        timestamps, values = timestamps[keep], values[keep]
+        if not len(timestamps):
+            return 0
+        if n + len(timestamps) > series.capacity:
+            series = self._grow(name, series, len(timestamps))
+            n = len(series)
+        series.timestamps[n:n + len(timestamps)] = timestamps
+        series.values[n:n + len(timestamps)] = values
+        series.header[2] = n + len(timestamps)
+        # Trimming only once a quarter has expired keeps appends O(1) amortized
+        expired = self._expired(series)
+        if expired and 4 * expired >= len(series):
+            self._rewrite(name, series, expired, series.capacity)
+        return len(timestamps)
+
+    def _expired(self, series):
+        """Number of leading samples of a series older than the retention"""
+        n = len(series)
+        if self.retention is None or not n:
+            return 0
+        return int(np.searchsorted(series.timestamps[:n], series.timestamps[n - 1] - self.retention))
+
+    def _rewrite(self, name, series, start, capacity):
+        """Swap in a copy of a series holding its samples from start on"""
+        n = len(series)
+        _SeriesFile.create(series.path, capacity, series.timestamps[start:n], series.values[start:n])
+        return self._open(name)
+
+    def _grow(self, name, series, incoming):
+        """Rewrite a full series at a larger capacity, without the samples past the retention"""
+        start = self._expired(series)
+        kept = len(series) - start
+        return self._rewrite(name, series, start, max(self.initial_capacity, 2 * (kept + incoming)))
+
+    def read(self, name, start=None, end=None):
+        """Read-only views of the timestamps and values of a series within [start, end]"""
+        series = self._open(name)
+        if series is None:
+            return np.empty(0), np.empty(0)
+        n = len(series)
+        timestamps = series.timestamps[:n]
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side='left'))
+        lo = max(lo, self._expired(series))
+        hi = n if end is None else int(np.searchsorted(timestamps, end, side='right'))
+        timestamps, values = timestamps[lo:hi], series.values[lo:hi]
+        timestamps.flags.writeable = False
+        values.flags.writeable = False
+        return timestamps, values
+
+    def last_timestamp(self, name):
+        """Timestamp of the newest sample of a series, None if it has none"""
+        series = self._open(name)
+        if series is None or not len(series):
+            return None
+        return float(series.timestamps[len(series) - 1])
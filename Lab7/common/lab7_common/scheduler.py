@@ -0,0 +1,54 @@
+import math
+import time
+import asyncio
+from prometheus_client import Counter, Gauge
+
+OVERRUN_POLICIES = ('skip', 'catchup')
+
+class DeadlineScheduler:
+    """Fires ticks on a fixed wall-clock grid, so fetch/score/print time does not stretch the period"""
+
+    def __init__(self, interval=60, offset=0, overrun='skip', prefix='lab7_monitor'):
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(f"overrun must be one of {', '.join(OVERRUN_POLICIES)}, got {overrun!r}")
+        self.interval = float(interval)
+        self.overrun = overrun
+        # Align the first deadline to the next multiple of interval (plus offset) on the wall clock, then keep
+        # counting on the monotonic clock so NTP steps and suspend cannot shift or repeat ticks
+        wall = time.time()
+        next_tick = math.ceil((wall - offset) / self.interval) * self.interval + offset
+        self._deadline = time.monotonic() + (next_tick - wall)
+        # With pre-fork workers the exported lag is the worst one among the live workers
+        self.lag = Gauge(f'{prefix}_tick_lag_seconds', 'Delay between the scheduled and actual start of the last tick',
+                         multiprocess_mode='livemax')
+        self.overruns = Counter(f'{prefix}_tick_overruns', 'Ticks whose work ran past the next deadline')
+        self.skipped = Counter(f'{prefix}_ticks_skipped', 'Deadlines dropped to get back on the grid after an overrun')
+
+    def _delay(self):
+        """Seconds until the next deadline, handling an overrun of the previous tick first"""
+        now = time.monotonic()
+        if now > self._deadline:
+            self.overruns.inc()
+            if self.overrun == 'skip':
+                # Fire once now for the latest missed deadline and drop the ones before it
+                missed = math.floor((now - self._deadline) / self.interval)
+                self._deadline += missed * self.interval
+                self.skipped.inc(missed)
+            # catchup keeps every missed deadline, they fire back to back until the loop is back on the grid
+        return max(0.0, self._deadline - now)
+
+    def _fire(self):
+        lag = time.monotonic() - self._deadline
+        self.lag.set(lag)
+        self._deadline += self.interval
+        return lag
+
+    def wait(self):
+        """Block until the next tick, returning how late it started in seconds"""
+        time.sleep(self._delay())
+        return self._fire()
+
+    async def wait_async(self):
+        """Await the next tick, returning how late it started in seconds"""
+        await asyncio.sleep(self._delay())
+        return self._fire()
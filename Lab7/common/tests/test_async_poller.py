@@ -0,0 +1,48 @@
+import asyncio
+import threading
+import pytest
+from lab7_common.async_poller import AsyncPoller
+
+def test_timed_out_fetch_holds_its_slot_until_the_call_returns():
+    release = threading.Event()
+    started = []
+
+    def slow():
+        started.append('slow')
+        release.wait(5)
+        return 'slow'
+
+    def fast():
+        started.append('fast')
+        return 'fast'
+
+    async def run():
+        poller = AsyncPoller(max_concurrency=1, query_timeout=0.05)
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await poller.fetch(slow)
+            queued = asyncio.ensure_future(poller.fetch(fast))
+            await asyncio.sleep(0.1)
+            # The slow call still runs on the only thread, the next fetch waits for the slot rather than the thread
+            assert started == ['slow']
+            release.set()
+            assert await queued == 'fast'
+        finally:
+            release.set()
+            poller.close()
+
+    asyncio.run(run())
+
+def test_fetch_all_returns_results_and_errors_in_order():
+    def fail():
+        raise ValueError('bad')
+
+    async def run():
+        poller = AsyncPoller(max_concurrency=2)
+        try:
+            return await poller.fetch_all([(lambda x: x * 2, (1,)), (fail, ()), (lambda: 'ok', ())])
+        finally:
+            poller.close()
+
+    doubled, error, ok = asyncio.run(run())
+    assert doubled == 2 and isinstance(error, ValueError) and ok == 'ok'
@@ -0,0 +1,90 @@
+import math
+import numpy as np
+from lab7_common.histogram import bucket_quantiles, matrix_quantiles, vector_quantiles
+
+INF = math.inf
+
+def quantile(q, upper_bounds, counts):
+    return float(bucket_quantiles([q], upper_bounds, counts)[0, 0])
+
+def test_interpolates_linearly_inside_the_bucket():
+    assert quantile(0.75, [1, 2, INF], [10, 20, 20]) == 1.5
+
+def test_first_bucket_starts_at_zero():
+    assert quantile(0.25, [1, 2, INF], [10, 20, 20]) == 0.5
+
+def test_first_bucket_with_non_positive_bound_returns_that_bound():
+    assert quantile(0.1, [-1, 2, INF], [10, 20, 20]) == -1
+
+def test_rank_in_inf_bucket_returns_highest_finite_bound():
+    assert quantile(0.99, [1, 2, INF], [10, 20, 40]) == 2
+
+def test_quantile_one_returns_the_bucket_reaching_the_total():
+    assert quantile(1, [1, 2, 4, INF], [10, 20, 20, 20]) == 2
+
+def test_missing_inf_bucket_is_nan():
+    assert math.isnan(quantile(0.5, [1, 2, 4], [10, 20, 30]))
+
+def test_single_bucket_is_nan():
+    assert math.isnan(quantile(0.5, [INF], [10]))
+
+def test_empty_histogram_is_nan():
+    assert math.isnan(quantile(0.5, [1, 2, INF], [0, 0, 0]))
+
+def test_nan_bucket_count_is_nan():
+    assert math.isnan(quantile(0.5, [1, 2, INF], [10, np.nan, 20]))
+
+def test_out_of_range_quantiles():
+    result = bucket_quantiles([-0.5, 1.5, np.nan], [1, 2, INF], [10, 20, 20])[0]
+    assert result[0] == -INF
+    assert result[1] == INF
+    assert math.isnan(result[2])
+
+def test_out_of_range_quantiles_without_buckets():
+    result = bucket_quantiles([-0.5, 1.5], [1, 2], [10, 20])[0]
+    assert list(result) == [-INF, INF]
+
+def test_duplicate_upper_bounds_are_summed():
+    # le="1" and le="1.0" are one bucket of 10, rank 10 of 20 falls exactly on its bound
+    assert quantile(0.5, [1, 1.0, 2, INF], [5, 5, 20, 20]) == 1
+
+def test_unsorted_buckets_are_sorted():
+    assert quantile(0.75, [INF, 2, 1], [20, 20, 10]) == 1.5
+
+def test_non_monotonic_counts_are_made_monotonic():
+    # The le="2" rate dipped below le="1", Prometheus lifts it back to 10
+    assert quantile(0.5, [1, 2, 4, INF], [10, 8, 20, 20]) == 1
+
+def test_rows_are_independent():
+    result = bucket_quantiles([0.5], [1, 2, INF], [[10, 20, 20], [0, 20, 20]])
+    assert list(result[:, 0]) == [1.0, 1.5]
+
+def bucket_series(labels, counts, value_key='value', timestamps=(1,)):
+    series = []
+    for le, count in counts:
+        metric = dict(labels, le=le)
+        if value_key == 'value':
+            series.append({'metric': metric, 'value': [timestamps[0], str(count)]})
+        else:
+            series.append({'metric': metric, 'values': [[t, str(c)] for t, c in zip(timestamps, count)]})
+    return series
+
+def test_vector_quantiles_groups_by_labels_and_sums_duplicate_le():
+    result = (bucket_series({'source_app': 'a', 'destination_app': 'b'},
+                            [('1', 5), ('1.0', 5), ('2', 20), ('+Inf', 20)])
+              + bucket_series({'source_app': 'c', 'destination_app': 'b'}, [('1', 0), ('2', 20), ('+Inf', 20)]))
+    samples = vector_quantiles(result, [0.5])
+    assert samples[('a', 'b', 0.5)] == (1.0, 1.0)
+    assert samples[('c', 'b', 0.5)] == (1.0, 1.5)
+
+def test_vector_quantiles_ignores_series_without_le():
+    result = [{'metric': {}, 'value': [1, '3']}] + bucket_series({}, [('1', 10), ('+Inf', 10)])
+    assert vector_quantiles(result, [0.5], by=()) == {(0.5,): (1.0, 0.5)}
+
+def test_matrix_quantiles_is_nan_where_a_bucket_has_no_sample():
+    result = bucket_series({}, [('1', [10, 10]), ('2', [20, 20])], 'values', (1, 2))
+    result.append({'metric': {'le': '+Inf'}, 'values': [[1, '20']]})
+    timestamps, values = matrix_quantiles(result, [0.75], by=())[(0.75,)]
+    assert list(timestamps) == [1, 2]
+    assert values[0] == 1.5
+    assert math.isnan(values[1])
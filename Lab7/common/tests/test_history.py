@@ -0,0 +1,45 @@
+import math
+import numpy as np
+import pytest
+from lab7_common.history import RingHistory
+
+def filled(rows, capacity=5, window=3):
+    history = RingHistory(['a', 'b'], capacity, window)
+    for i in range(rows):
+        history.append(float(i), [i, 10 * i])
+    return history
+
+def test_partial_buffer():
+    history = filled(2)
+    assert len(history) == 2
+    assert history.tail() == [(0.0, [0.0, 0.0]), (1.0, [1.0, 10.0])]
+    assert history.window_sum('a') == 1
+
+def test_wraparound_keeps_the_newest_rows_in_order():
+    history = filled(12)
+    assert len(history) == 5
+    assert [ts for ts, _ in history.tail()] == [7.0, 8.0, 9.0, 10.0, 11.0]
+    assert history.tail(2) == [(10.0, [10.0, 100.0]), (11.0, [11.0, 110.0])]
+
+@pytest.mark.parametrize('rows', [3, 5, 6, 10, 11, 23])
+def test_window_sums_match_the_last_rows(rows):
+    history = filled(rows)
+    last = np.arange(rows)[-3:]
+    assert history.window_sum('a') == last.sum()
+    assert history.window_sum('b') == 10 * last.sum()
+    assert history.window_mean('a') == last.mean()
+
+def test_window_ignores_nan():
+    history = RingHistory(['a'], capacity=4, window=3)
+    for value in [1, 2, np.nan, 4, np.nan]:
+        history.append(0, [value])
+    # Window is [nan, 4, nan]
+    assert history.window_sum('a') == 4
+    assert history.window_mean('a') == 4
+    history.append(0, [np.nan])
+    history.append(0, [np.nan])
+    assert math.isnan(history.window_mean('a'))
+
+def test_capacity_below_window_is_rejected():
+    with pytest.raises(ValueError):
+        RingHistory(['a'], capacity=2, window=3)
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from lab7_common.intervals import report_intervals
+
+pd = pytest.importorskip('pandas')
+
+class ConstantModel:
+    def __init__(self):
+        self.predicted = []
+
+    def predict(self, df):
+        self.predicted.append(len(df))
+        return pd.DataFrame({'yhat_lower': np.full(len(df), -1.0), 'yhat_upper': np.full(len(df), 1.0)})
+
+def test_report_intervals_subsamples_long_frames(capsys):
+    df = pd.DataFrame({'ds': np.arange(10000), 'y': np.where(np.arange(10000) % 2, 0.0, 5.0)})
+    model = ConstantModel()
+    _, coverage = report_intervals(model, df, 'samples', max_points=100)
+    assert model.predicted == [100]
+    assert coverage == pytest.approx(0.5, abs=0.05)
+    assert 'over 100 points' in capsys.readouterr().out
+
+def test_report_intervals_keeps_short_frames():
+    df = pd.DataFrame({'ds': np.arange(50), 'y': np.zeros(50)})
+    model = ConstantModel()
+    assert report_intervals(model, df, 'analytic')[1] == 1.0
+    assert model.predicted == [50]
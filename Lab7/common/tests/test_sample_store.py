@@ -0,0 +1,88 @@
+import os
+import numpy as np
+import pytest
+from lab7_common.sample_store import SampleStore, series_file
+
+def test_read_of_a_missing_series(tmp_path):
+    store = SampleStore(tmp_path)
+    timestamps, values = store.read('missing')
+    assert len(timestamps) == len(values) == 0
+    assert store.last_timestamp('missing') is None
+
+def test_append_sorts_and_keeps_strictly_increasing_timestamps(tmp_path):
+    store = SampleStore(tmp_path)
+    assert store.append('s', [3, 1, 2, 2], [30, 10, 20, 21]) == 3
+    # Overlapping fetches only add the samples newer than the last stored one
+    assert store.append('s', [2, 3, 4], [0, 0, 40]) == 1
+    assert store.append('s', [4], [0]) == 0
+    timestamps, values = store.read('s')
+    assert timestamps.tolist() == [1, 2, 3, 4]
+    assert values.tolist() == [10, 20, 30, 40]
+    assert store.last_timestamp('s') == 4
+
+def test_read_range_is_inclusive_and_read_only(tmp_path):
+    store = SampleStore(tmp_path)
+    store.append('s', np.arange(10.0), np.arange(10.0) * 2)
+    timestamps, values = store.read('s', 2.5, 6)
+    assert timestamps.tolist() == [3, 4, 5, 6]
+    assert values.tolist() == [6, 8, 10, 12]
+    with pytest.raises(ValueError):
+        values[0] = 0
+    assert len(store.read('s', 20, 30)[0]) == 0
+
+def test_series_names_map_to_distinct_files(tmp_path):
+    assert series_file(tmp_path, 'a/b') != series_file(tmp_path, 'a_b')
+
+def test_growth_keeps_every_sample(tmp_path):
+    store = SampleStore(tmp_path, initial_capacity=4)
+    for start in range(0, 20, 3):
+        store.append('s', np.arange(start, start + 3.0), np.arange(start, start + 3.0))
+    timestamps, values = store.read('s')
+    assert timestamps.tolist() == list(range(21))
+    assert np.array_equal(timestamps, values)
+
+def test_growth_drops_expired_samples(tmp_path):
+    store = SampleStore(tmp_path, retention=5, initial_capacity=4)
+    store.append('s', [0, 1], [0, 1])
+    store.append('s', [7, 8], [7, 8])
+    # The file is full, growing it leaves out 0 and 1, more than 5s older than the newest sample
+    store.append('s', [9], [9])
+    timestamps, values = store.read('s')
+    assert timestamps.tolist() == [7, 8, 9]
+    assert values.tolist() == [7, 8, 9]
+
+def test_retention_is_enforced_on_append_without_growth(tmp_path):
+    store = SampleStore(tmp_path, retention=10, initial_capacity=1000)
+    path = series_file(tmp_path, 's')
+    store.append('s', np.arange(8.0), np.arange(8.0))
+    inode = os.stat(path).st_ino
+    # One expired sample out of nine is hidden from reads but stays in the file
+    store.append('s', [11], [11])
+    assert store.read('s')[0].tolist() == [1, 2, 3, 4, 5, 6, 7, 11]
+    assert os.stat(path).st_ino == inode
+    # Once a quarter has expired the file is rewritten without them, at the same capacity
+    store.append('s', [13], [13])
+    assert store.read('s')[0].tolist() == [3, 4, 5, 6, 7, 11, 13]
+    assert os.stat(path).st_ino != inode
+    assert os.path.getsize(path) == 64 + 16 * 1000
+    assert len(SampleStore(tmp_path).read('s')[0]) == 7
+
+def test_reopen_from_another_instance(tmp_path):
+    writer = SampleStore(tmp_path, initial_capacity=4)
+    writer.append('s', [1, 2], [10, 20])
+    reader = SampleStore(tmp_path)
+    assert reader.read('s')[1].tolist() == [10, 20]
+    # The reader sees later appends, and remaps the file once the writer has grown it
+    writer.append('s', [3], [30])
+    assert reader.last_timestamp('s') == 3
+    writer.append('s', [4, 5, 6], [40, 50, 60])
+    assert reader.read('s', 4)[1].tolist() == [40, 50, 60]
+    assert SampleStore(tmp_path).append('s', [6, 7], [0, 70]) == 1
+    assert writer.read('s')[0].tolist() == [1, 2, 3, 4, 5, 6, 7]
+
+def test_slices_stay_valid_after_growth(tmp_path):
+    store = SampleStore(tmp_path, initial_capacity=4)
+    store.append('s', [1, 2], [10, 20])
+    _, values = store.read('s')
+    store.append('s', np.arange(3.0, 20.0), np.zeros(17))
+    assert values.tolist() == [10, 20]
@@ -0,0 +1,79 @@
+import itertools
+import pytest
+from prometheus_client import REGISTRY
+from lab7_common import scheduler
+from lab7_common.scheduler import DeadlineScheduler
+
+# Each scheduler registers its own metrics, so every test needs a fresh prefix
+prefixes = (f'test_scheduler_{i}' for i in itertools.count())
+
+class FakeClock:
+    def __init__(self, wall, mono):
+        self.offset = wall - mono
+        self.mono = mono
+        self.slept = []
+
+    def time(self):
+        return self.mono + self.offset
+
+    def monotonic(self):
+        return self.mono
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.mono += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock(wall=1003, mono=100)
+    monkeypatch.setattr(scheduler.time, 'time', clock.time)
+    monkeypatch.setattr(scheduler.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(scheduler.time, 'sleep', clock.sleep)
+    return clock
+
+def counter(prefix, name):
+    return REGISTRY.get_sample_value(f'{prefix}_{name}_total') or 0
+
+def test_first_tick_is_aligned_to_the_wall_clock_grid(clock):
+    ticks = DeadlineScheduler(interval=10, prefix=next(prefixes))
+    assert ticks.wait() == 0
+    assert clock.slept == [7]
+    clock.mono += 3
+    assert ticks.wait() == 0
+    assert clock.slept == [7, 7]
+
+def test_offset_shifts_the_grid(clock):
+    DeadlineScheduler(interval=10, offset=5, prefix=next(prefixes)).wait()
+    assert clock.slept == [2]
+
+def test_skip_fires_once_for_the_latest_missed_deadline(clock):
+    prefix = next(prefixes)
+    ticks = DeadlineScheduler(interval=10, overrun='skip', prefix=prefix)
+    # The first deadline is at 107, work until 142 misses 107, 117, 127 and 137
+    clock.mono = 142
+    assert ticks.wait() == 5
+    assert counter(prefix, 'tick_overruns') == 1
+    assert counter(prefix, 'ticks_skipped') == 3
+    assert ticks.wait() == 0
+    assert clock.slept == [0, 5]
+    assert clock.mono == 147
+
+def test_catchup_fires_every_missed_deadline(clock):
+    prefix = next(prefixes)
+    ticks = DeadlineScheduler(interval=10, overrun='catchup', prefix=prefix)
+    clock.mono = 142
+    assert [ticks.wait() for _ in range(5)] == [35, 25, 15, 5, 0]
+    assert clock.slept == [0, 0, 0, 0, 5]
+    assert counter(prefix, 'tick_overruns') == 4
+    assert counter(prefix, 'ticks_skipped') == 0
+
+def test_lag_gauge_reports_the_last_tick(clock):
+    prefix = next(prefixes)
+    ticks = DeadlineScheduler(interval=10, prefix=prefix)
+    clock.mono = 110.5
+    ticks.wait()
+    assert REGISTRY.get_sample_value(f'{prefix}_tick_lag_seconds') == pytest.approx(3.5)
+
+def test_unknown_overrun_policy_is_rejected(clock):
+    with pytest.raises(ValueError, match='overrun'):
+        DeadlineScheduler(overrun='drop', prefix=next(prefixes))
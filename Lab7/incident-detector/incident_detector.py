@@ -1,46 +1,195 @@
+import os
 import json
 import argparse
-import requests
 import time
-import logging
+import threading
+from collections import namedtuple
 from datetime import datetime
+import numpy as np
 from prometheus_client import Gauge, start_http_server
-import pandas as pd
 from tabulate import tabulate
+from lab7_common.history import RingHistory
+from ingest import start_ingest_server
+from snapshot import align, load_snapshot, save_snapshot
+from topology import ServiceGraph
+from lab7_common.prom_client import PrometheusClient
+from lab7_common.scheduler import OVERRUN_POLICIES, DeadlineScheduler
+
+# Accumulator rules, applied to every service at once: +RISE on an anomalous tick, -FALL otherwise, within [0, CAP]
+RISE = 1
+FALL = 2
+CAP = 10
+
+# Incident is stored as a severity code in the history
+INCIDENT_LABELS = {0: None, 1: "Sev 1", 2: "Sev 2"}
+
+# A monitored service, identified by the edge whose lab7_<source>_2_<destination>_anomaly_count gauge it reads
+Service = namedtuple('Service', ['source', 'destination'])
+
+def parse_service(value, destination='shippingservice'):
+    """Parse a SOURCE[:DESTINATION] service argument"""
+    source, _, dest = value.partition(':')
+    if not source:
+        raise argparse.ArgumentTypeError(f"Invalid service '{value}', expected SOURCE[:DESTINATION]")
+    return Service(source, dest or destination)
+
+def service_name(service):
+    return f"{service.source}->{service.destination}"
+
+def parse_group(value):
+    """Parse a NAME=SERVICE,SERVICE,... group argument"""
+    name, _, members = value.partition('=')
+    if not name or not members:
+        raise argparse.ArgumentTypeError(f"Invalid group '{value}', expected NAME=SERVICE,SERVICE,...")
+    return name, members.split(',')
+
+def load_services_config(config_file):
+    """Load services and groups from a JSON config: {"services": [...], "groups": {"name": [...]}}"""
+    with open(config_file) as f:
+        config = json.load(f)
+    return config.get('services', []), list(config.get('groups', {}).items())
 
 def parse_arguments():
     """Parse command-line arguments for incident detector"""
     parser = argparse.ArgumentParser(description='Boutique Service Incident Detector')
-    parser.add_argument('service1', help='First service name')
-    parser.add_argument('service2', help='Second service name')
+    parser.add_argument('services', nargs='*', metavar='SOURCE[:DESTINATION]',
+                        help='Services to correlate, by the edge their anomaly gauge is exported for')
+    parser.add_argument('--services-config', help='JSON file listing the services and groups to correlate')
+    parser.add_argument('--destination', default='shippingservice',
+                        help='Destination of the services given without one')
+    parser.add_argument('--group', dest='groups', action='append', type=parse_group, default=[],
+                        metavar='NAME=SERVICE,SERVICE,...',
+                        help='Services that raise a Sev 1 incident when hot together (can be repeated)')
     parser.add_argument('--port', type=int, default=8082, help='Prometheus scrape port')
+    parser.add_argument('--ingest-port', type=int, default=0,
+                        help='Port accepting anomalies pushed by the monitors on POST /ingest, '
+                             'Prometheus polling then only covers services that pushed nothing (0 disables)')
     parser.add_argument('--prometheus-url', 
                         default='http://prometheus.istio-system:9090', 
                         help='Prometheus server URL')
     parser.add_argument('--incident-threshold', type=int, default=5, 
-                        help='Threshold for declaring an incident')
+                        help='Threshold of the total temperature for declaring an incident')
+    parser.add_argument('--sev1-services', type=int, default=2,
+                        help='Number of hot services that makes an incident Sev 1')
+    parser.add_argument('--group-fraction', type=float, default=1.0,
+                        help='Fraction of a group that must be hot for the group to be hot')
+    parser.add_argument('--snapshot-file', default=os.environ.get('INCIDENT_SNAPSHOT_FILE'),
+                        help='File the accumulators and recent history are checkpointed to and resumed from on start '
+                             '(default: INCIDENT_SNAPSHOT_FILE, unset disables)')
+    parser.add_argument('--snapshot-interval', type=float, default=0,
+                        help='Minimum seconds between snapshots, taken after a tick (0 snapshots every tick)')
+    parser.add_argument('--snapshot-max-age', type=float, default=300,
+                        help='Seconds after which a snapshot is too old to resume from')
+    parser.add_argument('--snapshot-rows', type=int, default=60, help='History rows kept in a snapshot')
+    parser.add_argument('--topology-refresh', type=float, default=300,
+                        help='Seconds between refreshes of the service graph built from istio_requests_total, '
+                             'used to group hot services into incidents and rank their root (0 disables)')
+    parser.add_argument('--topology-ttl', type=float, default=3600,
+                        help='Seconds without traffic after which an edge leaves the service graph')
+    parser.add_argument('--history-size', type=int, default=1440,
+                        help='Number of results kept in memory')
+    parser.add_argument('--query-timeout', type=float, default=10,
+                        help='Deadline in seconds of each Prometheus query')
+    parser.add_argument('--tick-interval', type=float, default=60, help='Seconds between detection ticks')
+    parser.add_argument('--tick-offset', type=float, default=0,
+                        help='Seconds past each multiple of --tick-interval (wall clock) at which ticks fire')
+    parser.add_argument('--overrun', choices=OVERRUN_POLICIES, default='skip',
+                        help='When a tick runs past the next deadline: fire once and drop missed ticks, '
+                             'or run every missed tick back to back')
     
     # Add debug print to verify arguments
     args = parser.parse_args()
-    print(f"Debug: Parsed Arguments:", flush=True)
-    print(f"Service 1: {args.service1}", flush=True)
-    print(f"Service 2: {args.service2}", flush=True)
+    services, groups = list(args.services), list(args.groups)
+    if args.services_config:
+        config_services, config_groups = load_services_config(args.services_config)
+        services.extend(config_services)
+        groups.extend(config_groups)
+    args.services = list(dict.fromkeys(parse_service(s, args.destination) for s in services))
+    if not args.services:
+        parser.error('no services to correlate, pass SOURCE[:DESTINATION] services or --services-config')
+    args.groups = []
+    for name, members in groups:
+        members = [parse_service(m, args.destination) for m in members]
+        unknown = [service_name(m) for m in members if m not in args.services]
+        if unknown:
+            parser.error(f"group {name} lists services that are not correlated: {', '.join(unknown)}")
+        args.groups.append((name, members))
+
+    print("Debug: Parsed Arguments:", flush=True)
+    for service in args.services:
+        print(f"Service: {service_name(service)}", flush=True)
+    for name, members in args.groups:
+        print(f"Group {name}: {', '.join(service_name(m) for m in members)}", flush=True)
     print(f"Port: {args.port}", flush=True)
+    print(f"Ingest Port: {args.ingest_port or 'disabled'}", flush=True)
+    print(f"Snapshot File: {args.snapshot_file}", flush=True)
     print(f"Prometheus URL: {args.prometheus_url}", flush=True)
     print(f"Incident Threshold: {args.incident_threshold}", flush=True)
+    print(f"Sev 1 Services: {args.sev1_services}", flush=True)
+    print(f"Tick Interval: {args.tick_interval}s (offset {args.tick_offset}s, overrun {args.overrun})", flush=True)
     
     return args
 
-def setup_prometheus_metrics(service1, service2):
-    """Setup Prometheus metrics with prefixed and service-specific names"""
-    prefix = f'lab7_incident_{service1}_{service2}'
-    return {
+def result_columns(services):
+    """Numeric columns kept per tick in the result history"""
+    names = [service_name(s) for s in services]
+    return ([f'{n} Anomaly' for n in names] + [f'{n} Temperature' for n in names]
+            + ['Total_Temperature', 'Hot_Services', 'Incident'])
+
+def group_matrix(services, groups):
+    """Boolean (groups, services) membership matrix"""
+    index = {service: i for i, service in enumerate(services)}
+    matrix = np.zeros((len(groups), len(services)), dtype=bool)
+    for g, (_, members) in enumerate(groups):
+        matrix[g, [index[m] for m in members]] = True
+    return matrix
+
+def update_temperatures(temperatures, anomalies):
+    """One accumulator step for every service at once"""
+    return np.clip(temperatures + np.where(anomalies > 0, RISE, -FALL), 0, CAP)
+
+def classify_incident(temperatures, incident_threshold, groups, sev1_services=2, group_fraction=1.0):
+    """Severity code of the current temperatures, and which services and groups are hot"""
+    hot = temperatures > 0
+    # A group is hot once enough of its members are, computed for every group with one matrix product
+    needed = np.maximum(1, np.ceil(group_fraction * groups.sum(axis=1)))
+    hot_groups = groups.astype(np.int64) @ hot >= needed
+    if temperatures.sum() < incident_threshold or not hot.any():
+        return 0, hot, hot_groups
+    if hot.sum() >= sev1_services or hot_groups.any():
+        # Sev 1 Incident: several services, or a whole group, anomalous
+        return 1, hot, hot_groups
+    # Sev 2 Incident: anomalies confined to fewer services
+    return 2, hot, hot_groups
+
+def setup_prometheus_metrics(services, groups):
+    """Setup Prometheus metrics, one labelled series per service and group"""
+    prefix = 'lab7_incident'
+    service_temperature = Gauge(f'{prefix}_service_temperature', 'Accumulator temperature of a service',
+                                ['service'])
+    group_hot = Gauge(f'{prefix}_group_hot', 'Whether a service group is hot', ['group'])
+    metrics = {
         'total_temperature': Gauge(f'{prefix}_total_temperature', 'Total accumulator temperature'),
-        'service1_temperature': Gauge(f'{prefix}_service1_temperature', f'Accumulator for {service1}'),
-        'service2_temperature': Gauge(f'{prefix}_service2_temperature', f'Accumulator for {service2}'),
+        'hot_services': Gauge(f'{prefix}_hot_services', 'Number of services with a positive temperature'),
+        'service_temperature': [service_temperature.labels(service_name(s)) for s in services],
+        'group_hot': [group_hot.labels(name) for name, _ in groups],
         'sev1_incident': Gauge(f'{prefix}_sev1_incident', 'Severity 1 Incident Status'),
-        'sev2_incident': Gauge(f'{prefix}_sev2_incident', 'Severity 2 Incident Status')
+        'sev2_incident': Gauge(f'{prefix}_sev2_incident', 'Severity 2 Incident Status'),
+        'correlated_incidents': Gauge(f'{prefix}_correlated_incidents',
+                                      'Groups of anomalous services connected in the service graph'),
+        'root_cause': Gauge(f'{prefix}_root_cause', 'Root score of the likely root service of each correlated '
+                            'incident', ['service'])
     }
+    if len(services) == 2:
+        # The per-pair gauges of the two-service detector, still exported for existing dashboards and alerts
+        # while they move to the labelled series above. To be removed once nothing reads them.
+        legacy = f'lab7_incident_{services[0].source}_{services[1].source}'
+        replacements = {'total_temperature': 'total_temperature', 'service1_temperature': 'service_temperature',
+                        'service2_temperature': 'service_temperature', 'sev1_incident': 'sev1_incident',
+                        'sev2_incident': 'sev2_incident'}
+        metrics['legacy'] = {name: Gauge(f'{legacy}_{name}', f'Deprecated, use {prefix}_{replacement}')
+                             for name, replacement in replacements.items()}
+    return metrics
 
 def print_phase_header(phase_name):
     """Print a clearly visible phase header"""
@@ -50,158 +199,333 @@ def print_phase_header(phase_name):
     print(f"Timestamp: {datetime.now()}", flush=True)
     print(f"{border}\n", flush=True)
 
-def fetch_anomaly_metrics(prometheus_url, service1, service2):
+def short_list(names, limit=5):
+    """Comma separated names, truncated so a log line stays bounded however many services there are"""
+    names = list(names)
+    if len(names) <= limit:
+        return ', '.join(names)
+    return f"{', '.join(names[:limit])} (+{len(names) - limit} more)"
+
+def print_results(history, services, limit=5):
+    """Print the latest results and window summary"""
+    n = len(services)
+    names = [service_name(s) for s in services]
+    rows = []
+    for ts, values in history.tail(history.window):
+        hot = short_list((name for name, t in zip(names, values[n:2 * n]) if t > 0), limit)
+        rows.append([datetime.fromtimestamp(ts)] + values[2 * n:-1] + [INCIDENT_LABELS[int(values[-1])], hot])
+    print("\nIncident Detector Results:", flush=True)
+    print(tabulate(rows, 
+                   headers=['Timestamp', 'Total_Temperature', 'Hot_Services', 'Incident', 'Hot'],
+                   tablefmt='grid', 
+                   showindex=False), flush=True)
+
+    print("\nWindow Summary:", flush=True)
+    window_anomalies = np.array([history.window_sum(f'{name} Anomaly') for name in names])
+    # Only the services with the most anomalies in the window get a line
+    for i in np.argsort(-window_anomalies, kind='stable')[:limit]:
+        if window_anomalies[i]:
+            print(f"{names[i]} Anomalies: {int(window_anomalies[i])}", flush=True)
+    print(f"Services with anomalies: {int(np.count_nonzero(window_anomalies))} of {n}", flush=True)
+    print(f"Average Total Temperature: {history.window_mean('Total_Temperature'):.1f}\n", flush=True)
+
+def anomaly_metric(service):
+    """Name of the anomaly gauge monitor1 exports for a service's edge"""
+    return f"lab7_{service.source}_2_{service.destination}_anomaly_count"
+
+# Every monitor's anomaly gauge in one query, quantile series of an edge summed into one value per gauge
+ANOMALY_QUERY = 'sum by (__name__) ({__name__=~"lab7_.+_2_.+_anomaly_count"})'
+
+def fetch_anomaly_metrics(client, services):
     """
-    Fetch anomaly metrics with detailed debugging
+    Fetch the anomaly gauges of every service with a single query
     
     Args:
-        prometheus_url (str): URL of Prometheus server
-        service1 (str): First service name
-        service2 (str): Second service name
+        client (PrometheusClient): Client of the Prometheus server
+        services (list): Services to fetch, in detector order
     
     Returns:
-        tuple: (service1_anomaly, service2_anomaly)
+        np.ndarray: anomaly count of every service, 0 where no gauge was returned
     """
-    print(f"Attempting to fetch anomaly metrics:", flush=True)
-    print(f"Prometheus URL: {prometheus_url}", flush=True)
-    print(f"Service 1: {service1}", flush=True)
-    print(f"Service 2: {service2}", flush=True)
-
+    anomalies = np.zeros(len(services))
     try:
-        # Construct more robust query
-        query1 = f'sum({{__name__="lab7_{service1}_2_shippingservice_anomaly_count"}}) or vector(0)'
-        query2 = f'sum({{__name__="lab7_{service2}_2_shippingservice_anomaly_count"}}) or vector(0)'
-
-        print(f"Query 1: {query1}", flush=True)
-        print(f"Query 2: {query2}", flush=True)
-
-        # Add timeout and detailed error handling
-        response1 = requests.get(
-            f'{prometheus_url}/api/v1/query', 
-            params={'query': query1},
-            timeout=10
-        )
-        response2 = requests.get(
-            f'{prometheus_url}/api/v1/query', 
-            params={'query': query2},
-            timeout=10
-        )
-
-        # Log full response for debugging
-        print(f"Response 1 Status: {response1.status_code}", flush=True)
-        print(f"Response 1 Content: {response1.text}", flush=True)
-        print(f"Response 2 Status: {response2.status_code}", flush=True)
-        print(f"Response 2 Content: {response2.text}", flush=True)
-
-        # Extract anomaly values
-        anomaly1 = float(response1.json()['data']['result'][0]['value'][1]) if response1.json()['data']['result'] else 0
-        anomaly2 = float(response2.json()['data']['result'][0]['value'][1]) if response2.json()['data']['result'] else 0
-
-        print(f"Anomaly 1: {anomaly1}, Anomaly 2: {anomaly2}", flush=True)
-        return anomaly1, anomaly2
-
+        result = client.query(ANOMALY_QUERY)
     except Exception as e:
         print(f"Error in fetch_anomaly_metrics: {e}", flush=True)
-        # Print additional context about the error
-        import traceback
-        traceback.print_exc()
-        return 0, 0
+        return anomalies
+
+    # Gauges of edges that are not correlated here are ignored, missing ones count as 0 like `or vector(0)`
+    values = {series['metric'].get('__name__'): float(series['value'][1]) for series in result}
+    for i, service in enumerate(services):
+        anomalies[i] = values.get(anomaly_metric(service), 0)
+    found = sum(anomaly_metric(service) in values for service in services)
+    print(f"Fetched {len(result)} anomaly gauges, {found} of {len(services)} services reporting, "
+          f"{int(np.count_nonzero(anomalies))} anomalous", flush=True)
+    return anomalies
+
+class Correlator:
+    """Accumulators of every service, stepped by pushed events on arrival and by the polling loop under one lock"""
 
-def incident_detector(service1, service2, port, prometheus_url, incident_threshold):
-    """Main incident detection function"""
+    def __init__(self, services, groups, incident_threshold, metrics, sev1_services=2, group_fraction=1.0):
+        self.services = services
+        self.groups = groups
+        self.index = {service: i for i, service in enumerate(services)}
+        self.membership = group_matrix(services, groups)
+        self.incident_threshold = incident_threshold
+        self.sev1_services = sev1_services
+        self.group_fraction = group_fraction
+        self.metrics = metrics
+        # One temperature per service, with the anomaly count that last stepped it
+        self.temperatures = np.zeros(len(services))
+        self.anomalies = np.zeros(len(services))
+        # Temperatures as of the last tick: a push steps from these, so a service moves at most once per tick
+        self.base = np.zeros(len(services))
+        # Services pushed since the last tick with their combined counts, the tick leaves them alone
+        self.pushed = np.zeros(len(services), dtype=bool)
+        self.buffered = np.zeros(len(services))
+        self.incident = 0
+        self.lock = threading.Lock()
+
+    def step(self, indices, anomalies):
+        """Apply the accumulator rules to some services and publish the new state, the caller holds the lock"""
+        # Rules: 
+        # - Add 1 for anomalies 
+        # - Subtract 2 if no anomaly (floor at 0)
+        # - Cap accumulator values
+        self.temperatures[indices] = update_temperatures(self.base[indices], anomalies)
+        self.anomalies[indices] = anomalies
+        return self.publish(indices)
+
+    def publish(self, indices):
+        """Classify the current temperatures and update the gauges, the caller holds the lock"""
+        incident, hot, hot_groups = classify_incident(self.temperatures, self.incident_threshold, self.membership,
+                                                      self.sev1_services, self.group_fraction)
+        
+        # Update Prometheus metrics
+        metrics = self.metrics
+        metrics['total_temperature'].set(float(self.temperatures.sum()))
+        metrics['hot_services'].set(int(hot.sum()))
+        for i in np.atleast_1d(indices):
+            metrics['service_temperature'][i].set(self.temperatures[i])
+        for gauge, group_is_hot in zip(metrics['group_hot'], hot_groups):
+            gauge.set(int(group_is_hot))
+        metrics['sev1_incident'].set(int(incident == 1))
+        metrics['sev2_incident'].set(int(incident == 2))
+        legacy = metrics.get('legacy')
+        if legacy:
+            legacy['total_temperature'].set(float(self.temperatures.sum()))
+            legacy['service1_temperature'].set(self.temperatures[0])
+            legacy['service2_temperature'].set(self.temperatures[1])
+            legacy['sev1_incident'].set(int(incident == 1))
+            legacy['sev2_incident'].set(int(incident == 2))
+        self.incident = incident
+        return incident, hot, hot_groups
+
+    def state(self):
+        """Copies of the temperatures and latest anomalies of every service"""
+        with self.lock:
+            return self.temperatures.copy(), self.anomalies.copy()
+
+    def restore(self, temperatures, anomalies):
+        """Resume from saved temperatures and anomalies, NaN where a service has nothing saved"""
+        with self.lock:
+            saved = ~np.isnan(temperatures)
+            self.temperatures[saved] = temperatures[saved]
+            self.anomalies[saved] = anomalies[saved]
+            self.base[:] = self.temperatures
+            return self.publish(np.arange(len(self.services)))
+
+    def push(self, events):
+        """Step the services of a pushed batch on arrival, returns how many events were accepted and ignored"""
+        # Quantile monitors of one edge push separately, their flags add up like the polled gauges do
+        anomalies = {}
+        ignored = 0
+        for source, destination, anomaly in events:
+            i = self.index.get(Service(source, destination))
+            if i is None:
+                ignored += 1
+                continue
+            anomalies[i] = anomalies.get(i, 0) + anomaly
+        if not anomalies:
+            return 0, ignored
+        indices = np.fromiter(anomalies, dtype=np.int64)
+        values = np.fromiter(anomalies.values(), dtype=np.float64)
+        with self.lock:
+            # A monitor ticking faster than the detector pushes several times per tick: each push redoes the step
+            # from the last tick's temperature, anomalous if any push of the tick was, so the service moves once
+            self.buffered[indices] = np.where(self.pushed[indices], np.maximum(self.buffered[indices], values), values)
+            self.pushed[indices] = True
+            previous = self.incident
+            incident, hot, hot_groups = self.step(indices, self.buffered[indices])
+        if incident and incident != previous:
+            print_incident(incident, self.services, hot, self.groups, hot_groups, source='push')
+        return len(events) - ignored, ignored
+
+    def stale(self):
+        """Whether each service still needs its polled value this tick"""
+        with self.lock:
+            return ~self.pushed
+
+    def tick(self, polled=None):
+        """Step the services nothing was pushed for since the last tick, then snapshot a history row"""
+        with self.lock:
+            stale = np.flatnonzero(~self.pushed)
+            if polled is not None and len(stale):
+                incident, hot, hot_groups = self.step(stale, polled[stale])
+            else:
+                incident, hot, hot_groups = self.publish(stale)
+            # Pushes from here on step from this tick's temperatures
+            self.base[:] = self.temperatures
+            self.pushed[:] = False
+            row = np.concatenate([self.anomalies, self.temperatures,
+                                  [self.temperatures.sum(), hot.sum(), incident]])
+        if incident:
+            print_incident(incident, self.services, hot, self.groups, hot_groups)
+        return row
+
+def print_incident(incident, services, hot, groups, hot_groups, source=None):
+    """Print the severity and the hot services and groups of an incident"""
+    hot_names = short_list(service_name(s) for s, is_hot in zip(services, hot) if is_hot)
+    via = f" ({source})" if source else ""
+    if incident == 1:
+        hot_group_names = [name for (name, _), is_hot in zip(groups, hot_groups) if is_hot]
+        print(f"SEV 1 INCIDENT DETECTED{via}: {hot_names}"
+              + (f" (groups {short_list(hot_group_names)})" if hot_group_names else ""), flush=True)
+    elif incident == 2:
+        print(f"SEV 2 INCIDENT DETECTED{via}: {hot_names}", flush=True)
+
+def resume_from_snapshot(snapshot, correlator, history, services):
+    """Restore the accumulators and recent history of a snapshot, matching services and columns by name"""
+    names = [service_name(s) for s in services]
+    temperatures = align(names, snapshot['services'], snapshot['temperatures'])
+    anomalies = align(names, snapshot['services'], snapshot['anomalies'])
+    incident, hot, hot_groups = correlator.restore(temperatures, anomalies)
+    rows = align(history.columns, snapshot['columns'], snapshot['values'])
+    for timestamp, row in zip(snapshot['timestamps'], rows):
+        history.append(timestamp, row)
+    print(f"Resumed {int(np.count_nonzero(~np.isnan(temperatures)))} of {len(services)} services and "
+          f"{len(rows)} history rows from a {snapshot['age']:.0f}s old snapshot", flush=True)
+    if incident:
+        print_incident(incident, services, hot, correlator.groups, hot_groups, source='snapshot')
+
+def correlate_topology(graph, services, row, metrics, limit=5):
+    """Group the hot services of a result row by the service graph and publish the likely root of each group"""
+    n = len(services)
+    hot_edges = [(s.source, s.destination) for s, t in zip(services, row[n:2 * n]) if t > 0]
+    incidents = graph.correlate(hot_edges)
+    metrics['correlated_incidents'].set(len(incidents))
+    metrics['root_cause'].clear()
+    for _, roots in incidents:
+        root, score = roots[0]
+        metrics['root_cause'].labels(root).set(score)
+    if row[-1]:
+        for edges, roots in incidents[:limit]:
+            names = short_list((f"{source}->{destination}" for source, destination in edges), limit)
+            ranked = short_list((f"{name} ({score:+d})" for name, score in roots), 3)
+            print(f"Correlated incident of {len(edges)} service(s) [{names}], likely root: {ranked}", flush=True)
+    return incidents
+
+def incident_detector(services, port, prometheus_url, incident_threshold, history_size=1440,
+                      query_timeout=10, tick_interval=60, tick_offset=0, overrun='skip', groups=(),
+                      sev1_services=2, group_fraction=1.0, ingest_port=0, snapshot_file=None,
+                      snapshot_interval=0, snapshot_max_age=300, snapshot_rows=60, topology_refresh=300,
+                      topology_ttl=3600):
+    """Main incident detection function, correlating any number of services"""
     print_phase_header("STARTUP - Incident Detector")
     
     # Setup Prometheus metrics
-    metrics = setup_prometheus_metrics(service1, service2)
+    metrics = setup_prometheus_metrics(services, groups)
     
     # Start Prometheus server with dynamic port
     start_http_server(port)
+    client = PrometheusClient(prometheus_url, timeout=query_timeout)
+    scheduler = DeadlineScheduler(tick_interval, tick_offset, overrun, prefix='lab7_incident_detector')
     
-    # Accumulators
-    accumulator1 = 0
-    accumulator2 = 0
-    results = []
+    # Accumulators, one temperature per service
+    correlator = Correlator(services, groups, incident_threshold, metrics, sev1_services, group_fraction)
+    history = RingHistory(result_columns(services), history_size)
+    if snapshot_file:
+        # A restart within snapshot_max_age carries on from the saved temperatures instead of re-heating from 0
+        snapshot = load_snapshot(snapshot_file, snapshot_max_age)
+        if snapshot is not None:
+            resume_from_snapshot(snapshot, correlator, history, services)
+    last_snapshot = float('-inf')
+    # Service graph, grown from the edges carrying traffic and used to group hot services into incidents
+    graph = ServiceGraph(topology_ttl) if topology_refresh > 0 else None
+    last_refresh = float('-inf')
+    if ingest_port:
+        # Monitors push their scores here as soon as they have them, polling below only covers the silent ones
+        start_ingest_server(ingest_port, correlator.push)
+        print(f"Accepting pushed anomalies on :{ingest_port}/ingest", flush=True)
     
-    print_phase_header(f"NORMAL OPERATION - Monitoring {service1} and {service2}")
+    print_phase_header(f"NORMAL OPERATION - Monitoring {len(services)} services")
     print("Incident Detector started - waiting for initial data points...", flush=True)
     
     iteration = 0
     while True:
-        # Fetch anomaly metrics
-        anomaly1, anomaly2 = fetch_anomaly_metrics(
-            prometheus_url, service1, service2
-        )
+        scheduler.wait()
         
-        # Update accumulators
-        # Rules: 
-        # - Add 1 for anomalies 
-        # - Subtract 2 if no anomaly (floor at 0)
-        # - Cap accumulator values
-        accumulator1 = max(0, min(10, 
-            accumulator1 + (1 if anomaly1 > 0 else -2)
-        ))
-        accumulator2 = max(0, min(10, 
-            accumulator2 + (1 if anomaly2 > 0 else -2)
-        ))
+        # Fetch anomaly metrics, unless every service already pushed this tick
+        stale = correlator.stale()
+        if stale.any():
+            anomalies = fetch_anomaly_metrics(client, services)
+        else:
+            anomalies = None
+            print(f"All {len(services)} services pushed, skipping the Prometheus poll", flush=True)
         
-        # Calculate total temperature
-        total_temperature = accumulator1 + accumulator2
+        # Update accumulators and check for incidents
+        row = correlator.tick(anomalies)
         
-        # Update Prometheus metrics
-        metrics['total_temperature'].set(total_temperature)
-        metrics['service1_temperature'].set(accumulator1)
-        metrics['service2_temperature'].set(accumulator2)
+        # Store results
+        history.append(time.time(), row)
         
-        # Check for incidents
-        incident = None
-        if total_temperature >= incident_threshold:
-            if accumulator1 > 0 and accumulator2 > 0:
-                # Sev 1 Incident: Both services anomalous
-                metrics['sev1_incident'].set(1)
-                metrics['sev2_incident'].set(0)
-                incident = "Sev 1"
-                print(f"SEV 1 INCIDENT DETECTED: {service1} and {service2}", flush=True)
-            elif accumulator1 > 0 or accumulator2 > 0:
-                # Sev 2 Incident: One service anomalous
-                metrics['sev1_incident'].set(0)
-                metrics['sev2_incident'].set(1)
-                incident = "Sev 2"
-                print(f"SEV 2 INCIDENT DETECTED: {service1} or {service2}", flush=True)
-        else:
-            # Reset incident metrics if no incident
-            metrics['sev1_incident'].set(0)
-            metrics['sev2_incident'].set(0)
+        # Group the hot services by the service graph
+        if graph is not None:
+            if time.monotonic() - last_refresh >= topology_refresh:
+                try:
+                    added, expired = graph.refresh(client)
+                    last_refresh = time.monotonic()
+                    if added or expired:
+                        print(f"Service graph: {len(graph)} edges, {added} added, {expired} expired", flush=True)
+                except Exception as e:
+                    print(f"Error refreshing the service graph: {e}", flush=True)
+            correlate_topology(graph, services, row, metrics)
         
-        # Store results
-        results.append({
-            'Timestamp': datetime.now(),
-            'Service1_Anomaly': anomaly1,
-            'Service2_Anomaly': anomaly2,
-            'Service1_Temperature': accumulator1,
-            'Service2_Temperature': accumulator2,
-            'Total_Temperature': total_temperature,
-            'Incident': incident
-        })
+        # Checkpoint for a warm restart
+        if snapshot_file and time.monotonic() - last_snapshot >= snapshot_interval:
+            try:
+                save_snapshot(snapshot_file, [service_name(s) for s in services], *correlator.state(), history,
+                              snapshot_rows)
+                last_snapshot = time.monotonic()
+            except OSError as e:
+                print(f"Error saving snapshot {snapshot_file}: {e}", flush=True)
         
         # Print results
-        if len(results) > 0:
-            df_results = pd.DataFrame(results)
-            print("\nIncident Detector Results:", flush=True)
-            print(tabulate(df_results.tail(5), 
-                           headers='keys', 
-                           tablefmt='grid', 
-                           showindex=False), flush=True)
+        print_results(history, services)
         
         iteration += 1
-        time.sleep(60)
 
 if __name__ == "__main__":
     args = parse_arguments()
-    print(f"Starting Incident Detector for {args.service1} and {args.service2}")
+    print(f"Starting Incident Detector for {len(args.services)} services")
     incident_detector(
-        args.service1, 
-        args.service2, 
+        args.services, 
         args.port, 
         args.prometheus_url,
-        args.incident_threshold
-    )
\ No newline at end of file
+        args.incident_threshold,
+        args.history_size,
+        args.query_timeout,
+        args.tick_interval,
+        args.tick_offset,
+        args.overrun,
+        args.groups,
+        args.sev1_services,
+        args.group_fraction,
+        args.ingest_port,
+        args.snapshot_file,
+        args.snapshot_interval,
+        args.snapshot_max_age,
+        args.snapshot_rows,
+        args.topology_refresh,
+        args.topology_ttl
+    )
@@ -0,0 +1,50 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Push path of the monitors: POST /ingest with a JSON batch
+#   {"events": [{"source": "frontend", "destination": "shippingservice", "anomaly": 1}, ...]}
+# answered 202 with the number of events applied and ignored. Batches larger than this are refused.
+MAX_BODY_BYTES = 1 << 20
+
+def parse_events(body):
+    """(source, destination, anomaly) tuples of an ingest batch, ValueError when it is malformed"""
+    try:
+        events = json.loads(body)['events']
+        return [(str(event['source']), str(event['destination']), float(event['anomaly'])) for event in events]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"expected {{\"events\": [{{\"source\", \"destination\", \"anomaly\"}}, ...]}}: {e}")
+
+def start_ingest_server(port, handle_events):
+    """Serve POST /ingest from a daemon thread, handle_events(events) returns the (accepted, ignored) counts"""
+
+    class IngestHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            # One request per monitor tick, the detector's own output already says what was applied
+            pass
+
+        def reply(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path != '/ingest':
+                return self.reply(404, {'error': f"unknown path {self.path}"})
+            length = int(self.headers.get('Content-Length') or 0)
+            if length > MAX_BODY_BYTES:
+                return self.reply(413, {'error': f"batch larger than {MAX_BODY_BYTES} bytes"})
+            try:
+                events = parse_events(self.rfile.read(length))
+            except ValueError as e:
+                return self.reply(400, {'error': str(e)})
+            accepted, ignored = handle_events(events)
+            self.reply(202, {'accepted': accepted, 'ignored': ignored})
+
+    server = ThreadingHTTPServer(('', port), IngestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='ingest', daemon=True).start()
+    return server
@@ -0,0 +1,54 @@
+import os
+import time
+import numpy as np
+
+# Warm-restart checkpoint of the detector: the temperature and latest anomaly count of every service plus the
+# most recent history rows, in one small .npz file. Services and history columns are stored by name, so a
+# restart with a different service list still resumes the services both runs correlate.
+SNAPSHOT_VERSION = 1
+
+def save_snapshot(path, services, temperatures, anomalies, history, rows=60):
+    """Atomically write the accumulators and the last rows of the history"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tail = history.tail(rows)
+    values = np.array([row for _, row in tail], dtype=np.float64).reshape(len(tail), len(history.columns))
+    tmp_path = f"{path}.tmp.{os.getpid()}.npz"
+    np.savez(tmp_path,
+             version=SNAPSHOT_VERSION,
+             saved_at=time.time(),
+             services=np.array(services, dtype=str),
+             temperatures=temperatures,
+             anomalies=anomalies,
+             columns=np.array(history.columns, dtype=str),
+             timestamps=np.array([ts for ts, _ in tail], dtype=np.float64),
+             values=values)
+    os.replace(tmp_path, path)
+
+def load_snapshot(path, max_age):
+    """Contents of a snapshot no older than max_age seconds, None when there is none or it is stale"""
+    try:
+        with np.load(path) as data:
+            snapshot = {key: data[key] for key in data.files}
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable snapshot {path}: {e}", flush=True)
+        return None
+    if int(snapshot.get('version', 0)) != SNAPSHOT_VERSION:
+        print(f"Ignoring snapshot {path} written by another version", flush=True)
+        return None
+    age = time.time() - float(snapshot['saved_at'])
+    if age > max_age:
+        print(f"Ignoring snapshot {path}, {age:.0f}s old (max {max_age:g}s)", flush=True)
+        return None
+    snapshot['age'] = age
+    return snapshot
+
+def align(names, saved_names, saved_values):
+    """Last axis of saved_values rearranged from saved_names to names, NaN for names that were not saved"""
+    position = {name: i for i, name in enumerate(saved_names.tolist())}
+    aligned = np.full(saved_values.shape[:-1] + (len(names),), np.nan)
+    for i, name in enumerate(names):
+        if name in position:
+            aligned[..., i] = saved_values[..., position[name]]
+    return aligned
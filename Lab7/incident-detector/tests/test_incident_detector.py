@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+from prometheus_client import REGISTRY
+from incident_detector import (ANOMALY_QUERY, CAP, Correlator, Service, anomaly_metric, classify_incident,
+                               fetch_anomaly_metrics, group_matrix, setup_prometheus_metrics, update_temperatures)
+
+SERVICES = [Service('frontend', 'cart'), Service('checkout', 'cart'), Service('checkout', 'payment')]
+GROUPS = [('cart', [SERVICES[0], SERVICES[1]]), ('checkout', [SERVICES[1], SERVICES[2]])]
+
+@pytest.fixture
+def groups():
+    return group_matrix(SERVICES, GROUPS)
+
+def test_group_matrix(groups):
+    assert groups.tolist() == [[True, True, False], [False, True, True]]
+
+def test_group_matrix_without_groups():
+    assert group_matrix(SERVICES, []).shape == (0, 3)
+
+def test_update_temperatures_rises_falls_and_clips():
+    temperatures = np.array([0, 1, 5, CAP], dtype=float)
+    anomalies = np.array([0, 0, 2, 1], dtype=float)
+    assert update_temperatures(temperatures, anomalies).tolist() == [0, 0, 6, CAP]
+
+def test_no_incident_below_the_threshold(groups):
+    incident, hot, hot_groups = classify_incident(np.array([1.0, 1.0, 0.0]), 5, groups)
+    assert incident == 0
+    assert hot.tolist() == [True, True, False]
+    # Hot services and groups are reported even without an incident
+    assert hot_groups.tolist() == [True, False]
+
+def test_no_incident_when_nothing_is_hot(groups):
+    assert classify_incident(np.zeros(3), 0, groups)[0] == 0
+
+def test_sev2_for_a_single_hot_service(groups):
+    incident, hot, hot_groups = classify_incident(np.array([0.0, 0.0, 6.0]), 5, groups)
+    assert incident == 2
+    assert hot_groups.tolist() == [False, False]
+
+def test_sev1_for_several_hot_services():
+    incident, _, _ = classify_incident(np.array([3.0, 0.0, 3.0]), 5, group_matrix(SERVICES, []))
+    assert incident == 1
+
+def test_sev1_for_a_whole_hot_group(groups):
+    # Two hot services are needed for Sev 1 by count alone, the complete group is enough with sev1_services=3
+    incident, _, hot_groups = classify_incident(np.array([3.0, 3.0, 0.0]), 5, groups, sev1_services=3)
+    assert incident == 1
+    assert hot_groups.tolist() == [True, False]
+
+@pytest.mark.parametrize('group_fraction, expected', [(1.0, [False, False]), (0.5, [True, True]), (0.0, [True, True])])
+def test_group_fraction(groups, group_fraction, expected):
+    _, _, hot_groups = classify_incident(np.array([0.0, 6.0, 0.0]), 5, groups, sev1_services=3,
+                                         group_fraction=group_fraction)
+    assert hot_groups.tolist() == expected
+
+class FakeClient:
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.queries = []
+
+    def query(self, query):
+        self.queries.append(query)
+        if self.error:
+            raise self.error
+        return self.result
+
+def gauge(name, value):
+    return {'metric': {'__name__': name}, 'value': [1700000000, str(value)]}
+
+def test_anomaly_metric_matches_the_query_regex():
+    assert anomaly_metric(Service('frontend', 'cart')) == 'lab7_frontend_2_cart_anomaly_count'
+    assert anomaly_metric(Service('cart_service', 'redis_cart')) == 'lab7_cart_service_2_redis_cart_anomaly_count'
+
+def test_fetch_anomaly_metrics_reads_every_service_from_one_query(capsys):
+    services = [Service('frontend', 'cart'), Service('cart_service', 'redis_cart'), Service('ads', 'cart')]
+    client = FakeClient([gauge('lab7_frontend_2_cart_anomaly_count', 2),
+                         gauge('lab7_cart_service_2_redis_cart_anomaly_count', 1),
+                         gauge('lab7_other_2_cart_anomaly_count', 5)])
+    anomalies = fetch_anomaly_metrics(client, services)
+    assert client.queries == [ANOMALY_QUERY]
+    # Service names containing underscores are looked up by their exact gauge name, never split apart
+    assert anomalies.tolist() == [2, 1, 0]
+    assert '2 of 3 services reporting' in capsys.readouterr().out
+
+def test_fetch_anomaly_metrics_ignores_malformed_series():
+    services = [Service('frontend', 'cart')]
+    client = FakeClient([{'metric': {}, 'value': [1, '3']},
+                         gauge('lab7_frontend_anomaly_count', 4),
+                         gauge('lab7_frontend_2_cart_anomaly_count_total', 6),
+                         gauge('lab7_frontend_2_cart_anomaly_count', 1)])
+    assert fetch_anomaly_metrics(client, services).tolist() == [1]
+
+def test_fetch_anomaly_metrics_counts_missing_gauges_as_zero(capsys):
+    services = [Service('frontend', 'cart'), Service('checkout', 'cart')]
+    assert fetch_anomaly_metrics(FakeClient([]), services).tolist() == [0, 0]
+    assert '0 of 2 services reporting' in capsys.readouterr().out
+
+def test_fetch_anomaly_metrics_survives_a_failed_query(capsys):
+    services = [Service('frontend', 'cart')]
+    assert fetch_anomaly_metrics(FakeClient(error=ConnectionError('refused')), services).tolist() == [0]
+    assert 'refused' in capsys.readouterr().out
+
+class StubGauge:
+    def __init__(self):
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+@pytest.fixture
+def correlator():
+    metrics = {name: StubGauge() for name in ('total_temperature', 'hot_services', 'sev1_incident', 'sev2_incident')}
+    metrics['service_temperature'] = [StubGauge() for _ in SERVICES]
+    metrics['group_hot'] = [StubGauge() for _ in GROUPS]
+    return Correlator(SERVICES, GROUPS, 5, metrics)
+
+def test_push_is_applied_before_the_next_tick(correlator):
+    assert correlator.push([('frontend', 'cart', 1), ('nowhere', 'cart', 1)]) == (1, 1)
+    temperatures, anomalies = correlator.state()
+    assert temperatures.tolist() == [1, 0, 0]
+    assert anomalies.tolist() == [1, 0, 0]
+    assert correlator.metrics['service_temperature'][0].value == 1
+    assert correlator.metrics['total_temperature'].value == 1
+
+def test_pushes_within_a_tick_step_once(correlator):
+    correlator.push([('frontend', 'cart', 1)])
+    correlator.push([('frontend', 'cart', 1)])
+    correlator.push([('frontend', 'cart', 0)])
+    assert correlator.state()[0].tolist() == [1, 0, 0]
+    assert correlator.stale().tolist() == [False, True, True]
+
+def test_tick_leaves_pushed_services_alone(correlator):
+    correlator.push([('frontend', 'cart', 1)])
+    row = correlator.tick(np.array([0.0, 1.0, 0.0]))
+    assert correlator.state()[0].tolist() == [1, 1, 0]
+    assert row[3:6].tolist() == [1, 1, 0]
+    # The next push steps from the temperature the tick left behind
+    correlator.push([('frontend', 'cart', 1)])
+    assert correlator.state()[0].tolist() == [2, 1, 0]
+    assert correlator.stale().tolist() == [False, True, True]
+
+def test_two_services_keep_the_legacy_pair_gauges():
+    services = [Service('legacyfront', 'cart'), Service('legacycheckout', 'cart')]
+    correlator = Correlator(services, [], 2, setup_prometheus_metrics(services, []))
+    correlator.push([('legacyfront', 'cart', 1)])
+    correlator.tick(np.array([0.0, 1.0]))
+    legacy = 'lab7_incident_legacyfront_legacycheckout'
+    assert REGISTRY.get_sample_value(f'{legacy}_service1_temperature') == 1
+    assert REGISTRY.get_sample_value(f'{legacy}_service2_temperature') == 1
+    assert REGISTRY.get_sample_value(f'{legacy}_total_temperature') == 2
+    assert REGISTRY.get_sample_value(f'{legacy}_sev1_incident') == 1
+    assert REGISTRY.get_sample_value('lab7_incident_service_temperature', {'service': 'legacyfront->cart'}) == 1
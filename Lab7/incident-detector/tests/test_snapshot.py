@@ -0,0 +1,68 @@
+import os
+import numpy as np
+import pytest
+import snapshot
+from lab7_common.history import RingHistory
+from snapshot import SNAPSHOT_VERSION, align, load_snapshot, save_snapshot
+
+def history_of(rows, columns=('a Anomaly', 'b Anomaly')):
+    history = RingHistory(list(columns), capacity=10, window=3)
+    for i in range(rows):
+        history.append(100.0 + i, [i, 10 * i])
+    return history
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / 'state' / 'snapshot.npz')
+    save_snapshot(path, ['a', 'b'], np.array([3.0, 0.0]), np.array([1.0, 0.0]), history_of(5), rows=3)
+    assert os.listdir(tmp_path / 'state') == ['snapshot.npz']
+    loaded = load_snapshot(path, max_age=60)
+    assert loaded['services'].tolist() == ['a', 'b']
+    assert loaded['temperatures'].tolist() == [3, 0]
+    assert loaded['anomalies'].tolist() == [1, 0]
+    assert loaded['columns'].tolist() == ['a Anomaly', 'b Anomaly']
+    assert loaded['timestamps'].tolist() == [102, 103, 104]
+    assert loaded['values'].tolist() == [[2, 20], [3, 30], [4, 40]]
+    assert 0 <= loaded['age'] < 60
+
+def test_round_trip_of_an_empty_history(tmp_path):
+    path = str(tmp_path / 'snapshot.npz')
+    save_snapshot(path, ['a', 'b'], np.zeros(2), np.zeros(2), history_of(0))
+    loaded = load_snapshot(path, max_age=60)
+    assert loaded['values'].shape == (0, 2)
+    assert len(loaded['timestamps']) == 0
+
+def test_stale_snapshot_is_discarded(tmp_path, monkeypatch, capsys):
+    path = str(tmp_path / 'snapshot.npz')
+    save_snapshot(path, ['a', 'b'], np.ones(2), np.ones(2), history_of(1))
+    saved_at = float(np.load(path)['saved_at'])
+    monkeypatch.setattr(snapshot.time, 'time', lambda: saved_at + 301)
+    assert load_snapshot(path, max_age=300) is None
+    assert '301s old' in capsys.readouterr().out
+    monkeypatch.setattr(snapshot.time, 'time', lambda: saved_at + 299)
+    assert load_snapshot(path, max_age=300)['age'] == pytest.approx(299)
+
+def test_missing_snapshot(tmp_path):
+    assert load_snapshot(str(tmp_path / 'missing.npz'), max_age=300) is None
+
+def test_unreadable_snapshot(tmp_path, capsys):
+    path = tmp_path / 'snapshot.npz'
+    path.write_bytes(b'not a zip file')
+    assert load_snapshot(str(path), max_age=300) is None
+    assert 'unreadable' in capsys.readouterr().out
+
+def test_snapshot_of_another_version(tmp_path):
+    path = str(tmp_path / 'snapshot.npz')
+    np.savez(path, version=SNAPSHOT_VERSION + 1)
+    assert load_snapshot(path, max_age=300) is None
+
+def test_align_follows_a_changed_service_list():
+    saved = np.array(['a', 'b', 'c'])
+    # c kept its value, x is new and has none, b was dropped
+    assert np.array_equal(align(['c', 'x', 'a'], saved, np.array([1.0, 2.0, 3.0])), [3.0, np.nan, 1.0],
+                          equal_nan=True)
+    rows = align(['c', 'x', 'a'], saved, np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]))
+    assert np.array_equal(rows, [[3.0, np.nan, 1.0], [6.0, np.nan, 4.0]], equal_nan=True)
+
+def test_align_with_nothing_saved():
+    rows = align(['a'], np.array([], dtype=str), np.empty((0, 0)))
+    assert rows.shape == (0, 1)
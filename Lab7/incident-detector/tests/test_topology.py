@@ -0,0 +1,74 @@
+import pytest
+from topology import ServiceGraph, rank_roots
+
+def series(source, destination):
+    return {'metric': {'source_app': source, 'destination_app': destination}, 'value': [0, '1']}
+
+class FakeClient:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.queries = []
+
+    def query(self, query):
+        self.queries.append(query)
+        return self.results.pop(0)
+
+def graph_of(*edges, ttl=3600):
+    graph = ServiceGraph(ttl=ttl)
+    graph.refresh(FakeClient([series(s, d) for s, d in edges]), now=1000)
+    return graph
+
+def test_refresh_looks_back_a_ttl_then_the_interval_since_the_last_refresh():
+    graph = ServiceGraph(ttl=600)
+    client = FakeClient([series('frontend', 'cart'), {'metric': {'source_app': 'x'}}], [])
+    assert graph.refresh(client, now=1000) == (1, 0)
+    assert graph.refresh(client, now=1300) == (0, 0)
+    assert '[600s]' in client.queries[0]
+    assert '[300s]' in client.queries[1]
+    assert len(graph) == 1
+
+def test_refresh_expires_idle_edges():
+    graph = ServiceGraph(ttl=600)
+    client = FakeClient([series('frontend', 'cart'), series('cart', 'redis')], [series('cart', 'redis')], [])
+    graph.refresh(client, now=1000)
+    assert graph.refresh(client, now=1500) == (0, 0)
+    # frontend->cart was last seen at 1000, cart->redis at 1500
+    assert graph.refresh(client, now=1700) == (0, 1)
+    cart = graph.index['cart']
+    assert graph.callers[cart] == set()
+    assert graph.callees[cart] == {graph.index['redis']}
+
+def test_edges_sharing_a_service_form_one_incident():
+    graph = graph_of()
+    incidents = graph.correlate([('frontend', 'cart'), ('checkout', 'cart'), ('ads', 'redis')])
+    assert [edges for edges, _ in incidents] == [[('frontend', 'cart'), ('checkout', 'cart')], [('ads', 'redis')]]
+    assert incidents[0][1][0] == ('cart', 2)
+
+def test_edges_joined_through_the_graph():
+    # checkout calls payment, so a slow payment->bank and a slow frontend->checkout are one incident
+    graph = graph_of(('frontend', 'checkout'), ('checkout', 'payment'), ('payment', 'bank'), ('ads', 'redis'))
+    incidents = graph.correlate([('payment', 'bank'), ('frontend', 'checkout'), ('ads', 'redis')])
+    assert [edges for edges, _ in incidents] == [[('payment', 'bank'), ('frontend', 'checkout')], [('ads', 'redis')]]
+
+def test_services_two_hops_apart_stay_separate():
+    graph = graph_of(('frontend', 'checkout'), ('checkout', 'payment'), ('payment', 'bank'))
+    incidents = graph.correlate([('frontend', 'checkout'), ('bank', 'ledger')])
+    assert len(incidents) == 2
+
+def test_unknown_services_still_correlate():
+    graph = graph_of(('frontend', 'cart'))
+    incidents = graph.correlate([('new', 'other'), ('other', 'third'), ('frontend', 'cart')])
+    assert [edges for edges, _ in incidents] == [[('new', 'other'), ('other', 'third')], [('frontend', 'cart')]]
+
+def test_correlate_nothing():
+    assert graph_of().correlate([]) == []
+
+def test_rank_roots_prefers_the_shared_downstream():
+    edges = [('frontend', 'checkout'), ('checkout', 'payment'), ('cart', 'payment')]
+    roots = rank_roots(edges)
+    assert roots[0] == ('payment', 2)
+    assert roots[-1][1] == -1
+
+@pytest.mark.parametrize('edges, root', [([('a', 'b')], 'b'), ([('a', 'b'), ('b', 'c')], 'c')])
+def test_rank_roots_of_a_chain(edges, root):
+    assert rank_roots(edges)[0][0] == root
@@ -0,0 +1,120 @@
+import time
+import math
+
+# Service dependency graph seen by Istio, source_app -> destination_app for every pair with traffic. Nodes get
+# integer ids and each keeps the sets of its callers and callees, so the graph is a sparse adjacency index whose
+# size follows the edges that exist, not the square of the number of services.
+EDGE_QUERY = ('sum by (source_app, destination_app) '
+              '(increase(istio_requests_total{{reporter="source", source_app!="unknown"}}[{window}s])) > 0')
+
+class ServiceGraph:
+    """Sparse adjacency index of the mesh, refreshed with the edges that carried traffic since the last refresh"""
+
+    def __init__(self, ttl=3600):
+        self.ttl = ttl
+        self.names = []
+        self.index = {}
+        self.callees = []
+        self.callers = []
+        self.last_seen = {}
+        self.refreshed_at = None
+
+    def __len__(self):
+        return len(self.last_seen)
+
+    def node(self, name):
+        """Id of a service, added to the index on first sight"""
+        i = self.index.get(name)
+        if i is None:
+            i = self.index[name] = len(self.names)
+            self.names.append(name)
+            self.callees.append(set())
+            self.callers.append(set())
+        return i
+
+    def add_edge(self, source, destination, seen_at):
+        u, v = self.node(source), self.node(destination)
+        new = (u, v) not in self.last_seen
+        self.callees[u].add(v)
+        self.callers[v].add(u)
+        self.last_seen[(u, v)] = seen_at
+        return new
+
+    def remove_edge(self, u, v):
+        self.callees[u].discard(v)
+        self.callers[v].discard(u)
+        del self.last_seen[(u, v)]
+
+    def refresh(self, client, now=None):
+        """Merge in the edges with traffic since the previous refresh and expire those idle for ttl seconds"""
+        now = time.time() if now is None else now
+        # Only the interval since the last refresh is queried, the first refresh looks back a whole ttl
+        window = self.ttl if self.refreshed_at is None else max(60, now - self.refreshed_at)
+        result = client.query(EDGE_QUERY.format(window=math.ceil(window)))
+        added = 0
+        for series in result:
+            metric = series['metric']
+            if 'source_app' in metric and 'destination_app' in metric:
+                added += self.add_edge(metric['source_app'], metric['destination_app'], now)
+        expired = [edge for edge, seen_at in self.last_seen.items() if now - seen_at > self.ttl]
+        for u, v in expired:
+            self.remove_edge(u, v)
+        self.refreshed_at = now
+        return added, len(expired)
+
+    def correlate(self, hot_edges):
+        """
+        Group anomalous edges into incidents and rank the likely root service of each
+
+        Two anomalous edges belong to the same incident when they share a service, or when a service of one
+        calls or is called by a service of the other. Only the neighbours of services touched by an anomalous
+        edge are visited, never every pair of services.
+
+        Args:
+            hot_edges (list): (source, destination) names of the anomalous edges
+
+        Returns:
+            list: incidents, largest first, as (edges, roots) with roots a list of (service, score), best first
+        """
+        parent = {}
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        def union(i, j):
+            parent[find(i)] = find(j)
+
+        # Services outside the index (no traffic seen yet) still join through the edge that names them
+        ids = {}
+        for source, destination in hot_edges:
+            for name in (source, destination):
+                if name not in ids:
+                    ids[name] = self.index.get(name, -1 - len(ids))
+                    parent[ids[name]] = ids[name]
+            union(ids[source], ids[destination])
+        for i in list(parent):
+            if i < 0:
+                continue
+            for j in self.callees[i] | self.callers[i]:
+                if j in parent:
+                    union(i, j)
+
+        incidents = {}
+        for source, destination in hot_edges:
+            incidents.setdefault(find(ids[source]), []).append((source, destination))
+        return sorted(((edges, rank_roots(edges)) for edges in incidents.values()), key=lambda x: -len(x[0]))
+
+def rank_roots(edges):
+    """Services of an incident ranked as its likely root: the shared downstream that anomalous calls lead into"""
+    # A slow service makes every edge calling it anomalous, and edges calling those callers in turn, so the root
+    # receives the most anomalous calls while making the fewest itself
+    incoming, outgoing = {}, {}
+    for source, destination in edges:
+        outgoing[source] = outgoing.get(source, 0) + 1
+        incoming[destination] = incoming.get(destination, 0) + 1
+    services = set(incoming) | set(outgoing)
+    scores = {s: incoming.get(s, 0) - outgoing.get(s, 0) for s in services}
+    return sorted(scores.items(), key=lambda item: (-item[1], -incoming.get(item[0], 0), item[0]))
@@ -58,57 +58,43 @@
 #     start_http_server(8099)
 #     main()
 
-import requests
-from prometheus_client import start_http_server, Gauge, Summary, Histogram, Counter
-import sys, getopt
-from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
-
-# Prophet model for time series forecast
-from prophet import Prophet
-
-# Data processing
-import numpy as np
-import pandas as pd
-from datetime import datetime
-import time
-from urllib.parse import urlencode
-import json
-
-def extract_first_y( test_json ):
-    print(test_json, flush=True)
-    result =  test_json['data']['result']
-    val = result[0]['value'][1]
-    print(val, flush=True)
-    return float(val)
-
-
-def main():                
-
-    url_test_data_50 = {
-        "query": "histogram_quantile( 0.5, sum by (le) (rate(istio_request_duration_milliseconds_bucket{app='frontend', destination_app='shippingservice', reporter='source'}[1m])))"
-    }
-    url_test_data_95 = {
-        "query": "histogram_quantile( 0.95, sum by (le) (rate(istio_request_duration_milliseconds_bucket{app='frontend', destination_app='shippingservice', reporter='source'}[1m])))"
-    }
-    test_url = "http://34.19.14.122:9090/api/v1/query"
+import os
+import asyncio
+from prometheus_client import start_http_server, Gauge
+from lab7_common.prom_client import PrometheusClient
+from lab7_common.async_poller import AsyncPoller
+from lab7_common.scheduler import DeadlineScheduler
+from lab7_common.histogram import vector_quantiles
+
+async def main():                
+
+    # fetch the bucket rates once, both quantiles are computed from them locally
+    query = "sum by (le) (rate(istio_request_duration_milliseconds_bucket{app='frontend', destination_app='shippingservice', reporter='source'}[1m]))"
+    client = PrometheusClient(os.environ.get('PROMETHEUS_URL', "http://34.19.14.122:9090"))
     
     g_req50 = Gauge("frontend_to_shipping_req_50", "request seconds frontend to shipping service" )
     g_req50.set(0)
 
     g_req95 = Gauge("frontend_to_shipping_req_95", "request seconds frontend to shipping service" )
     g_req95.set(0)
+    gauges = {0.5: g_req50, 0.95: g_req95}
 
+    # the fetch runs off the event loop, bounded by the query timeout
+    poller = AsyncPoller(max_concurrency=1, query_timeout=10)
+    # ticks on a fixed 15s grid, however long the queries take
+    scheduler = DeadlineScheduler(float(os.environ.get('TICK_INTERVAL', 15)), float(os.environ.get('TICK_OFFSET', 0)),
+                                  os.environ.get('TICK_OVERRUN', 'skip'), prefix='frontend_to_shipping')
     while True:
-        r = requests.get(test_url, params=url_test_data_50)
-        req_time_50 = extract_first_y( r.json() )
-        g_req50.set(req_time_50)
+        await scheduler.wait_async()
+        [result] = await poller.fetch_all([(client.query, (query,))])
 
-        r = requests.get(test_url, params=url_test_data_95)
-        req_time_95 = extract_first_y( r.json() )
-        g_req95.set(req_time_95)
-
-        time.sleep(15)
+        if isinstance(result, Exception):
+            print(f"percentile query failed: {result!r}", flush=True)
+            continue
+        for (q,), (timestamp, value) in vector_quantiles(result, list(gauges), by=()).items():
+            print(f"{q:g} quantile request time: {value}", flush=True)
+            gauges[q].set(value)
 
 if __name__ == '__main__':
     start_http_server(8099)
-    main()    
\ No newline at end of file
+    asyncio.run(main())    
\ No newline at end of file
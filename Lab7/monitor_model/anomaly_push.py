@@ -0,0 +1,47 @@
+import queue
+import threading
+import requests
+from instrumentation import PUSH_FAILURES
+
+# Batches of anomaly events sent to the incident detector's POST /ingest as soon as a tick is scored, so an
+# anomaly steps its service's accumulator on arrival instead of after a Prometheus scrape and the next poll.
+# Delivery is best effort: the detector still polls the anomaly gauges of services it heard nothing from.
+
+def anomaly_events(rows):
+    """Ingest events of (edge, anomaly) pairs, quantile monitors of the same edge summed into one event"""
+    totals = {}
+    for edge, anomaly in rows:
+        key = (edge.source, edge.destination)
+        totals[key] = totals.get(key, 0) + anomaly
+    return [{'source': source, 'destination': destination, 'anomaly': anomaly}
+            for (source, destination), anomaly in totals.items()]
+
+class AnomalyPusher:
+    """Posts event batches from a daemon thread, so a slow or missing detector never delays a tick"""
+
+    def __init__(self, url, timeout=2, max_pending=8):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.thread = threading.Thread(target=self._run, name='anomaly-push', daemon=True)
+        self.thread.start()
+
+    def push(self, events):
+        """Queue a batch for sending, dropped when the detector has fallen max_pending batches behind"""
+        if not events:
+            return
+        try:
+            self.pending.put_nowait(events)
+        except queue.Full:
+            PUSH_FAILURES.inc()
+
+    def _run(self):
+        while True:
+            events = self.pending.get()
+            try:
+                response = self.session.post(self.url, json={'events': events}, timeout=self.timeout)
+                response.raise_for_status()
+            except requests.RequestException as e:
+                PUSH_FAILURES.inc()
+                print(f"Failed to push {len(events)} anomaly event(s) to {self.url}: {e}", flush=True)
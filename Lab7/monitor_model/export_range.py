@@ -0,0 +1,188 @@
+import os
+import re
+import math
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from lab7_common.prom_client import PrometheusClient, is_transient
+from training_data import save_columnar
+
+# Prometheus refuses range queries returning more than 11,000 points per series, so long exports are split into
+# chunks of at most --chunk-points steps, fetched concurrently and merged back into one matrix per series.
+
+DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800, 'y': 31536000}
+
+def parse_duration(value):
+    """Seconds of a Prometheus duration like 30s, 1h30m or a plain number of seconds"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r'(\d+(?:\.\d+)?)(ms|s|m|h|d|w|y)', value)
+    if not parts or ''.join(n + unit for n, unit in parts) != value:
+        raise argparse.ArgumentTypeError(f"invalid duration {value!r}")
+    return sum(float(n) * DURATION_UNITS[unit] for n, unit in parts)
+
+def parse_time(value, now=None):
+    """Unix seconds of 'now', a unix timestamp, an RFC 3339 time, or a duration ago like 7d"""
+    now = time.time() if now is None else now
+    if value == 'now':
+        return now
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    except ValueError:
+        return now - parse_duration(value)
+
+def split_range(start, end, step, chunk_points):
+    """[start, end] chunks of at most chunk_points steps, each one starting a step after the previous end"""
+    # Samples fall on multiples of step and chunks end on multiples of the chunk span, both on the absolute clock,
+    # so a rerun with a relative --start asks for the same chunks again and can resume them
+    span = step * chunk_points
+    chunks = []
+    chunk_start = math.ceil(start / step) * step
+    while chunk_start <= end:
+        chunk_end = min((math.floor(chunk_start / span) + 1) * span - step, end)
+        chunks.append((chunk_start, chunk_end))
+        chunk_start = chunk_end + step
+    return chunks
+
+def chunk_dir(output, query, step):
+    """Directory of the finished chunks of an export, specific to its query and step so resumes cannot mix them"""
+    key = hashlib.sha256(f"{query}\n{step:g}".encode()).hexdigest()[:16]
+    return os.path.join(f"{output}.chunks", key)
+
+def fetch_chunk(client, query, chunk, step, path, retries=5, backoff=1.0):
+    """Fetch one chunk into path, retrying transient errors with exponential backoff, unless an earlier run did"""
+    if os.path.exists(path):
+        return path, 0
+    for attempt in range(retries + 1):
+        try:
+            result = client.query_range(query, chunk[0], chunk[1], f"{step:g}s")
+            break
+        except Exception as e:
+            # A bad query or too many points fails the same way every time, only the export stops sooner
+            if attempt == retries or not is_transient(e):
+                raise
+            delay = backoff * 2 ** attempt
+            print(f"Chunk {chunk[0]:.0f}-{chunk[1]:.0f} failed ({e}), retrying in {delay:g}s", flush=True)
+            time.sleep(delay)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+    return path, attempt
+
+def merge_chunks(paths):
+    """Merge chunk results into one matrix, series matched by labels, samples sorted and deduped by timestamp"""
+    merged = {}
+    for path in paths:
+        with open(path) as f:
+            for series in json.load(f):
+                key = tuple(sorted(series['metric'].items()))
+                merged.setdefault(key, (series['metric'], []))[1].extend(series['values'])
+    result = []
+    for metric, values in merged.values():
+        timestamps = np.array([t for t, _ in values], dtype=np.float64)
+        # A sample on a chunk boundary can come back from both chunks, keep one
+        _, first = np.unique(timestamps, return_index=True)
+        result.append({'metric': metric, 'values': [values[i] for i in first]})
+    return result
+
+def write_output(result, output, fmt):
+    """Write the merged matrix as a Prometheus query_range JSON document, or as a columnar .npz file"""
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    if fmt == 'npz':
+        if not result:
+            raise SystemExit("The query returned no series, nothing to write")
+        if len(result) > 1:
+            # Same rule as read_prometheus_series, the monitors train on the first series of an export
+            print(f"Query returned {len(result)} series, writing the first one "
+                  f"({result[0]['metric']}) to the columnar file", flush=True)
+        values = np.array(result[0]['values'], dtype=np.float64).reshape(-1, 2)
+        save_columnar(output, values[:, 0], values[:, 1])
+        return
+    tmp_path = f"{output}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump({'status': 'success', 'data': {'resultType': 'matrix', 'result': result}}, f)
+    os.replace(tmp_path, output)
+
+def export_range(client, query, start, end, step, output, fmt='json', chunk_points=10000, concurrency=4,
+                 retries=5, keep_chunks=False):
+    """Export a query_range of any length to output, resuming from the chunks a previous run finished"""
+    chunks = split_range(start, end, step, chunk_points)
+    directory = chunk_dir(output, query, step)
+    os.makedirs(directory, exist_ok=True)
+    paths = [os.path.join(directory, f"{chunk[0]:.3f}-{chunk[1]:.3f}.json") for chunk in chunks]
+    resumed = sum(os.path.exists(path) for path in paths)
+    print(f"Exporting {len(chunks)} chunk(s) of up to {chunk_points} points, {resumed} already fetched", flush=True)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='export') as executor:
+        futures = {executor.submit(fetch_chunk, client, query, chunk, step, path, retries): chunk
+                   for chunk, path in zip(chunks, paths)}
+        failed = 0
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"Chunk {chunk[0]:.0f}-{chunk[1]:.0f} failed after {retries} retries: {e}", flush=True)
+    if failed:
+        raise SystemExit(f"{failed} chunk(s) failed, run the same command again to resume")
+
+    result = merge_chunks(paths)
+    write_output(result, output, fmt)
+    points = sum(len(series['values']) for series in result)
+    print(f"Wrote {len(result)} series, {points} points to {output} "
+          f"in {time.perf_counter() - started:.1f}s", flush=True)
+    if not keep_chunks:
+        shutil.rmtree(f"{output}.chunks", ignore_errors=True)
+    return result
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Export a Prometheus query_range of any length as training data')
+    parser.add_argument('--prometheus-url', default='http://prometheus.istio-system:9090',
+                        help='Prometheus server URL')
+    parser.add_argument('--query', required=True, help='PromQL expression to export')
+    parser.add_argument('--start', required=True,
+                        help="Start time: unix seconds, RFC 3339, or a duration ago like 7d")
+    parser.add_argument('--end', default='now', help="End time, same formats as --start (default: now)")
+    parser.add_argument('--step', type=parse_duration, default=30, help='Query resolution step, like 30s')
+    parser.add_argument('--output', required=True, help='Output file, .npz writes the columnar format')
+    parser.add_argument('--format', choices=['json', 'npz'],
+                        help='Prometheus query_range JSON, or a columnar file the monitors load directly '
+                             '(default: from the output extension)')
+    parser.add_argument('--chunk-points', type=int, default=10000,
+                        help='Maximum steps per query_range, below the Prometheus limit of 11000')
+    parser.add_argument('--concurrency', type=int, default=4, help='Chunks fetched at the same time')
+    parser.add_argument('--retries', type=int, default=5, help='Retries of a failed chunk, with exponential backoff')
+    parser.add_argument('--query-timeout', type=float, default=60, help='Deadline in seconds of each chunk query')
+    parser.add_argument('--keep-chunks', action='store_true', help='Keep the fetched chunks after writing the output')
+    args = parser.parse_args()
+    args.format = args.format or ('npz' if args.output.endswith('.npz') else 'json')
+    now = time.time()
+    args.start, args.end = parse_time(args.start, now), parse_time(args.end, now)
+    if args.start > args.end:
+        parser.error('--start must not be after --end')
+    if args.chunk_points < 2:
+        parser.error('--chunk-points must be at least 2')
+    return args
+
+if __name__ == '__main__':
+    args = parse_arguments()
+    client = PrometheusClient(args.prometheus_url, timeout=args.query_timeout, pool_size=args.concurrency)
+    export_range(client, args.query, args.start, args.end, args.step, args.output, args.format,
+                 args.chunk_points, args.concurrency, args.retries, args.keep_chunks)
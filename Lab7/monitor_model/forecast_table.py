@@ -0,0 +1,68 @@
+import os
+import numpy as np
+from datetime import datetime
+
+def grid_size(period, step):
+    """Number of points of an evenly spaced grid over one period, at the step closest to the requested one"""
+    return max(1, round(period / step))
+
+class ForecastTable:
+    """One period of a periodic forecast, evaluated once and served by interpolation"""
+
+    def __init__(self, period, yhat, yhat_lower, yhat_upper):
+        self.period = float(period)
+        self.yhat = np.ascontiguousarray(yhat, dtype=np.float64)
+        self.yhat_lower = np.ascontiguousarray(yhat_lower, dtype=np.float64)
+        self.yhat_upper = np.ascontiguousarray(yhat_upper, dtype=np.float64)
+        self.size = len(self.yhat)
+        self.step = self.period / self.size
+
+    @classmethod
+    def from_model(cls, model, period, step=10):
+        """Evaluate a flat-growth, single-seasonality model on a grid covering one period (in seconds)"""
+        import pandas as pd
+        # Spaced period / size apart, the step lookup() indexes with, even when step does not divide the period
+        size = grid_size(period, step)
+        seconds = np.arange(size, dtype=np.float64) * (period / size)
+        # Same timestamp conversion as the monitor uses for its test datapoints
+        df_grid = pd.DataFrame({'ds': [datetime.fromtimestamp(sec) for sec in seconds]})
+        forecast = model.predict(df_grid)
+        return cls(period, forecast['yhat'].values, forecast['yhat_lower'].values,
+                   forecast['yhat_upper'].values)
+
+    def save(self, path):
+        """Atomically write the table to an uncompressed .npz file"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f"{path}.tmp.{os.getpid()}.npz"
+        np.savez(tmp_path, period=self.period, yhat=self.yhat, yhat_lower=self.yhat_lower,
+                 yhat_upper=self.yhat_upper)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a table written by save()"""
+        with np.load(path) as data:
+            return cls(data['period'], data['yhat'], data['yhat_lower'], data['yhat_upper'])
+
+    def lookup(self, seconds):
+        """Return (yhat, yhat_lower, yhat_upper) at a time in seconds, linearly interpolated"""
+        position = (seconds % self.period) / self.step
+        i = int(position)
+        frac = position - i
+        i %= self.size
+        j = (i + 1) % self.size
+        return (
+            float(self.yhat[i] + (self.yhat[j] - self.yhat[i]) * frac),
+            float(self.yhat_lower[i] + (self.yhat_lower[j] - self.yhat_lower[i]) * frac),
+            float(self.yhat_upper[i] + (self.yhat_upper[j] - self.yhat_upper[i]) * frac)
+        )
+
+    def lookup_many(self, seconds):
+        """Vectorized lookup, returning yhat, yhat_lower and yhat_upper arrays"""
+        position = (np.asarray(seconds, dtype=np.float64) % self.period) / self.step
+        i = np.floor(position).astype(np.int64)
+        frac = position - i
+        i %= self.size
+        j = (i + 1) % self.size
+        return tuple(column[i] + (column[j] - column[i]) * frac
+                     for column in (self.yhat, self.yhat_lower, self.yhat_upper))
@@ -0,0 +1,128 @@
+import json
+import numpy as np
+from lab7_common.intervals import IntervalForecaster
+
+# A forecaster is built from the model hyperparameters, has fit(df) taking a ds/y frame and returning
+# itself, and predict(df) returning a frame with yhat, yhat_lower and yhat_upper for every ds row.
+# Prophet already has that shape, FourierForecaster mirrors it without cmdstan.
+
+def _days(ds):
+    """Days since the epoch of a datetime column, the time scale Prophet's seasonalities use"""
+    import pandas as pd
+    return pd.to_datetime(ds).values.astype('datetime64[ns]').astype(np.int64) / (1e9 * 24 * 3600)
+
+class FourierForecaster:
+    """Flat level plus one Fourier seasonality fitted by least squares, with residual-quantile intervals"""
+
+    def __init__(self, interval_width=0.99, seasonality_period=1/24, fourier_order=5):
+        self.interval_width = interval_width
+        self.seasonality_period = seasonality_period
+        self.fourier_order = fourier_order
+        self.coef = None
+        self.residual_lower = 0.0
+        self.residual_upper = 0.0
+
+    def _features(self, days):
+        """Design matrix of an intercept and the sin/cos terms, same terms as Prophet's add_seasonality"""
+        angles = 2 * np.pi * np.outer(days / self.seasonality_period, np.arange(1, self.fourier_order + 1))
+        return np.hstack([np.ones((len(days), 1)), np.sin(angles), np.cos(angles)])
+
+    def fit(self, df):
+        y = np.asarray(df['y'], dtype=np.float64)
+        X = self._features(_days(df['ds']))
+        self.coef = np.linalg.lstsq(X, y, rcond=None)[0]
+        residuals = y - X @ self.coef
+        tail = (1 - self.interval_width) / 2
+        self.residual_lower, self.residual_upper = np.quantile(residuals, [tail, 1 - tail])
+        return self
+
+    def predict(self, df):
+        import pandas as pd
+        yhat = self._features(_days(df['ds'])) @ self.coef
+        return pd.DataFrame({
+            'ds': df['ds'].values,
+            'yhat': yhat,
+            'yhat_lower': yhat + self.residual_lower,
+            'yhat_upper': yhat + self.residual_upper
+        })
+
+    def to_json(self):
+        return json.dumps({
+            'interval_width': self.interval_width,
+            'seasonality_period': self.seasonality_period,
+            'fourier_order': self.fourier_order,
+            'coef': self.coef.tolist(),
+            'residual_lower': float(self.residual_lower),
+            'residual_upper': float(self.residual_upper)
+        })
+
+    @classmethod
+    def from_json(cls, text):
+        state = json.loads(text)
+        model = cls(state['interval_width'], state['seasonality_period'], state['fourier_order'])
+        model.coef = np.array(state['coef'], dtype=np.float64)
+        model.residual_lower = state['residual_lower']
+        model.residual_upper = state['residual_upper']
+        return model
+
+FORECASTERS = ('prophet', 'fourier')
+
+def _build_engine(name, params, uncertainty_samples):
+    if name == 'fourier':
+        return FourierForecaster(params['interval_width'], params['seasonality_period'], params['fourier_order'])
+    if name == 'prophet':
+        # Imported here so the NumPy engine runs without Prophet/cmdstan installed
+        from prophet import Prophet
+        model = Prophet(
+            interval_width=params['interval_width'],
+            uncertainty_samples=uncertainty_samples,
+            yearly_seasonality=False,
+            weekly_seasonality=False,
+            daily_seasonality=False,
+            growth='flat'
+        )
+        model.add_seasonality(name='hourly', period=params['seasonality_period'],
+                              fourier_order=params['fourier_order'])
+        return model
+    raise ValueError(f"Unknown forecaster {name!r}, expected one of {', '.join(FORECASTERS)}")
+
+def build_forecaster(name, params):
+    """Unfitted forecaster of the given engine and interval method for the model hyperparameters"""
+    method = params.get('interval_method', 'samples')
+    if method == 'samples':
+        return _build_engine(name, params, params.get('uncertainty_samples', 1000))
+    # Only yhat is needed from the engine, so Prophet skips its uncertainty simulation entirely
+    return IntervalForecaster(_build_engine(name, params, 0), method, params['interval_width'])
+
+def forecaster_version(name):
+    """Version string artifacts of an engine are tied to"""
+    if name == 'prophet':
+        # Read from the package metadata, so keying a cached table does not import Prophet
+        from importlib.metadata import version
+        return f"prophet-{version('prophet')}"
+    return f"{name}-1"
+
+def forecaster_to_json(name, model):
+    if isinstance(model, IntervalForecaster):
+        return json.dumps({
+            'interval_method': model.method,
+            'interval_width': model.interval_width,
+            'half_width': model.half_width,
+            'model': forecaster_to_json(name, model.model)
+        })
+    if name == 'prophet':
+        from prophet.serialize import model_to_json
+        return model_to_json(model)
+    return model.to_json()
+
+def forecaster_from_json(name, text):
+    state = json.loads(text)
+    if 'interval_method' in state:
+        model = IntervalForecaster(forecaster_from_json(name, state['model']), state['interval_method'],
+                                   state['interval_width'])
+        model.half_width = state['half_width']
+        return model
+    if name == 'prophet':
+        from prophet.serialize import model_from_json
+        return model_from_json(text)
+    return FourierForecaster.from_json(text)
@@ -0,0 +1,47 @@
+import time
+from contextlib import contextmanager
+from prometheus_client import Counter, Histogram
+
+# Histograms of the monitor's own hot path, exported next to the lab7_* result gauges.
+# The edge label is "source->destination", or "batch" for the grouped query serving every edge.
+PREFIX = 'lab7_monitor'
+
+# Finer than the client default buckets, table lookups and metric updates take microseconds
+FAST_BUCKETS = (.00001, .000025, .00005, .0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+QUERY_SECONDS = Histogram(f'{PREFIX}_query_seconds', 'Prometheus query latency', ['edge'])
+RESPONSE_BYTES = Histogram(f'{PREFIX}_response_bytes', 'Prometheus response body size', ['edge'],
+                           buckets=SIZE_BUCKETS)
+PARSE_SECONDS = Histogram(f'{PREFIX}_parse_seconds', 'Prometheus response JSON decode time', ['edge'],
+                          buckets=FAST_BUCKETS)
+PREDICT_SECONDS = Histogram(f'{PREFIX}_predict_seconds', 'Forecast time of one datapoint', ['edge'],
+                            buckets=FAST_BUCKETS)
+METRIC_UPDATE_SECONDS = Histogram(f'{PREFIX}_metric_update_seconds', 'Result gauge and history update time',
+                                  ['edge'], buckets=FAST_BUCKETS)
+TICK_SECONDS = Histogram(f'{PREFIX}_tick_seconds', 'Duration of a whole polling tick, fetch to print',
+                         buckets=(.01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+FETCH_FAILURES = Counter(f'{PREFIX}_fetch_failures', 'Ticks an edge got no datapoint', ['edge'])
+STORE_FAILURES = Counter(f'{PREFIX}_store_failures', 'Datapoints not appended to the local sample store', ['edge'])
+PUSH_FAILURES = Counter(f'{PREFIX}_push_failures', 'Anomaly event batches not delivered to the incident detector')
+WORKER_RESTARTS = Counter(f'{PREFIX}_worker_restarts', 'Pre-fork workers restarted after exiting', ['worker'])
+
+def edge_label(edge):
+    return f"{edge.source}->{edge.destination}"
+
+def observe_query(label, stats):
+    """Record the latency, size and parse time a PrometheusClient call wrote into its stats dict"""
+    if not stats:
+        return
+    QUERY_SECONDS.labels(label).observe(stats['seconds'])
+    RESPONSE_BYTES.labels(label).observe(stats['bytes'])
+    PARSE_SECONDS.labels(label).observe(stats['parse_seconds'])
+
+@contextmanager
+def timed(histogram, label):
+    """Observe the wall time of the with block into histogram[label]"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(label).observe(time.perf_counter() - start)
@@ -0,0 +1,44 @@
+import os
+import json
+from forecasters import forecaster_version, forecaster_to_json, forecaster_from_json
+from training_data import file_digest
+from forecast_table import grid_size
+
+def artifact_key(training_file, params, forecaster='prophet'):
+    """Hash the training file contents, model hyperparameters and forecaster into a cache key"""
+    digest = file_digest(training_file)
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    # Serialized models are only guaranteed to load with the engine version that wrote them
+    digest.update(forecaster_version(forecaster).encode())
+    return digest.hexdigest()
+
+def artifact_path(cache_dir, training_file, params, forecaster='prophet'):
+    """Path of the fitted model artifact for a training file, hyperparameters and forecaster"""
+    name = os.path.splitext(os.path.basename(training_file))[0]
+    return os.path.join(cache_dir, f"{name}-{artifact_key(training_file, params, forecaster)[:16]}.json")
+
+def table_path(cache_dir, training_file, params, forecaster='prophet', step=10):
+    """Path of the forecast table artifact evaluated from a model artifact at the given step"""
+    # Named by the step the grid really has, so tables built before steps were snapped to the period are not reused
+    period = params['seasonality_period'] * 24 * 3600
+    step = period / grid_size(period, step)
+    return f"{os.path.splitext(artifact_path(cache_dir, training_file, params, forecaster))[0]}-table{step:g}.npz"
+
+def load_model(path, forecaster='prophet'):
+    """Load a fitted model artifact, returning None if it does not exist"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return forecaster_from_json(forecaster, f.read())
+    except Exception as e:
+        print(f"Ignoring unreadable model artifact {path}: {e}", flush=True)
+        return None
+
+def save_model(model, path, forecaster='prophet'):
+    """Atomically write a fitted model artifact"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        f.write(forecaster_to_json(forecaster, model))
+    os.replace(tmp_path, path)
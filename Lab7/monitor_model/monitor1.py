@@ -1,13 +1,47 @@
+import os
 import json
 import argparse
-import requests
-import pandas as pd
 import time
+import math
+import asyncio
+import csv
+import threading
+import numpy as np
+from collections import namedtuple
+from functools import partial
 from datetime import datetime
-from prophet import Prophet
 from prometheus_client import Gauge, start_http_server
-from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
-from tabulate import tabulate
+from model_cache import artifact_path, table_path, load_model, save_model
+from forecasters import FORECASTERS, build_forecaster
+from lab7_common.intervals import INTERVAL_METHODS, interval_coverage, report_intervals
+from forecast_table import ForecastTable
+from lab7_common.histogram import matrix_quantiles, vector_quantiles
+from lab7_common.history import RingHistory
+from lab7_common.prom_client import PrometheusClient, values_to_arrays
+from training_data import load_series
+from lab7_common.async_poller import AsyncPoller
+from lab7_common.scheduler import OVERRUN_POLICIES, DeadlineScheduler
+from lab7_common.sample_store import SampleStore
+from export_range import parse_time
+from anomaly_push import AnomalyPusher, anomaly_events
+from prefork import Supervisor, clear_multiprocess_dir, multiprocess_dir, shard_edges
+from instrumentation import (FETCH_FAILURES, METRIC_UPDATE_SECONDS, PREDICT_SECONDS, STORE_FAILURES, TICK_SECONDS,
+                             edge_label, observe_query, timed)
+
+# Hyperparameters of the fitted model, also part of the model artifact cache key
+MODEL_PARAMS = {
+    'interval_width': 0.99,
+    'seasonality_period': 1/24,
+    'fourier_order': 5,
+    'interval_method': 'samples',
+    'uncertainty_samples': 1000
+}
+
+# Numeric columns kept per edge in the result history
+RESULT_COLUMNS = ['Actual', 'Predicted', 'Lower Bound', 'Upper Bound', 'Anomaly', 'MAE', 'MAPE']
+
+# Floor of the MAPE denominator, as in sklearn.metrics.mean_absolute_percentage_error
+EPSILON = 2.220446049250313e-16
 
 # def parse_arguments():
 #     """Parse command-line arguments for monitor configuration"""
@@ -21,71 +55,222 @@ from tabulate import tabulate
 #                         help='Prometheus server URL')
 #     return parser.parse_args()
 
+# One monitored latency quantile of a service pair, each quantile has its own training file and model
+Edge = namedtuple('Edge', ['source', 'destination', 'training_file', 'quantile'], defaults=[0.5])
+
+# Fitted model and its optional forecast table, swapped together by the retrainer
+ServingModel = namedtuple('ServingModel', ['model', 'table'])
+
+def parse_edge(value):
+    """Parse a SOURCE:DESTINATION:TRAINING_FILE[@QUANTILE] edge argument"""
+    spec, _, quantile = value.partition('@')
+    parts = spec.split(':', 2)
+    if len(parts) != 3 or not all(parts):
+        raise argparse.ArgumentTypeError(
+            f"Invalid edge '{value}', expected SOURCE:DESTINATION:TRAINING_FILE[@QUANTILE]")
+    try:
+        return Edge(*parts, float(quantile) if quantile else 0.5)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid quantile '{quantile}' in edge '{value}'")
+
+def load_edges_config(config_file):
+    """Load the list of monitored edges from a JSON config file"""
+    with open(config_file) as f:
+        config = json.load(f)
+    return [Edge(e['source'], e['destination'], e['training_file'], float(e.get('quantile', 0.5)))
+            for e in config['edges']]
+
+def edge_name(edge):
+    """Display name of an edge and its quantile"""
+    return f"{edge.source}->{edge.destination} q{edge.quantile:g}"
+
+def edge_key(edge):
+    """Key of an edge's datapoints in fetched and replayed series"""
+    return (edge.source, edge.destination, edge.quantile)
+
+def series_key(metric):
+    """Key of a returned series, from its labels, unlabelled series are medians"""
+    return (metric.get('source_app'), metric.get('destination_app'), float(metric.get('quantile', 0.5)))
+
+def edge_pairs(edges):
+    """Quantiles monitored on each (source, destination) pair"""
+    pairs = {}
+    for edge in edges:
+        pairs.setdefault((edge.source, edge.destination), set()).add(edge.quantile)
+    return pairs
+
 def parse_arguments():
     """Parse command-line arguments for monitor configuration"""
     parser = argparse.ArgumentParser(description='Boutique Service Monitor')
-    parser.add_argument('source_service', help='Source service name')
-    parser.add_argument('destination_service', help='Destination service name')
-    parser.add_argument('training_file', help='Path to training data JSON file')
+    parser.add_argument('source_service', nargs='?', help='Source service name')
+    parser.add_argument('destination_service', nargs='?', help='Destination service name')
+    parser.add_argument('training_file', nargs='?', help='Path to training data JSON file')
+    parser.add_argument('--edge', dest='edges', action='append', type=parse_edge, default=[],
+                        metavar='SOURCE:DESTINATION:TRAINING_FILE[@QUANTILE]',
+                        help='Additional edge to monitor, the latency quantile defaults to 0.5 (can be repeated)')
+    parser.add_argument('--edges-config', help='JSON file listing the edges to monitor')
     parser.add_argument('--port', type=int, default=8080, help='Prometheus scrape port')
-    parser.add_argument('--prometheus-url', 
-                        default='http://prometheus.istio-system:9090', 
+    parser.add_argument('--prometheus-url',
+                        default='http://prometheus.istio-system:9090',
                         help='Prometheus server URL')
-    
+    parser.add_argument('--model-cache-dir', default=os.environ.get('MODEL_CACHE_DIR'),
+                        help='Directory of fitted model artifacts and columnar training data reused across restarts')
+    parser.add_argument('--build-artifacts', action='store_true',
+                        help='Fit and save the model artifacts for every edge, then exit')
+    parser.add_argument('--forecaster', choices=FORECASTERS, default='prophet',
+                        help='Model engine: Prophet, or a NumPy-only least-squares fit of the same Fourier model')
+    parser.add_argument('--interval', choices=INTERVAL_METHODS, default=MODEL_PARAMS['interval_method'],
+                        help="How yhat_lower/yhat_upper are computed: the engine's sampled interval, "
+                             "a Gaussian on training residuals, or split-conformal on a calibration split")
+    parser.add_argument('--uncertainty-samples', type=int, default=MODEL_PARAMS['uncertainty_samples'],
+                        help='Prophet uncertainty simulations per predicted row with --interval samples')
+    parser.add_argument('--serving', choices=['predict', 'table'], default='predict',
+                        help='Score with model.predict() every tick, or with a precomputed forecast table')
+    parser.add_argument('--tick-interval', type=float, default=60, help='Seconds between polling ticks')
+    parser.add_argument('--tick-offset', type=float, default=0,
+                        help='Seconds past each multiple of --tick-interval (wall clock) at which ticks fire')
+    parser.add_argument('--overrun', choices=OVERRUN_POLICIES, default='skip',
+                        help='When a tick runs past the next deadline: fire once and drop missed ticks, '
+                             'or run every missed tick back to back')
+    parser.add_argument('--quiet', action='store_true',
+                        help='Print one line per edge and tick instead of the results table')
+    parser.add_argument('--table-step', type=float, default=10,
+                        help='Grid step in seconds of the precomputed forecast table, rounded to divide the '
+                             'seasonality period evenly')
+    parser.add_argument('--history-size', type=int, default=1440,
+                        help='Number of results kept in memory per edge')
+    parser.add_argument('--fetch', choices=['batch', 'per-edge'], default='batch',
+                        help='Fetch every edge with one grouped query, or with one query per edge')
+    parser.add_argument('--query-timeout', type=float, default=10,
+                        help='Deadline in seconds of each Prometheus query')
+    parser.add_argument('--engine', choices=['sync', 'async'], default='sync',
+                        help='Poll with a blocking loop, or with an asyncio scheduler running fetches concurrently')
+    parser.add_argument('--max-concurrency', type=int, default=8,
+                        help='Maximum number of concurrent Prometheus queries of the async engine')
+    parser.add_argument('--replay-file',
+                        help='Backtest the edges over a recorded Prometheus query_range JSON file, then exit')
+    parser.add_argument('--replay-start', help='Backtest over a Prometheus query_range from this time, then exit')
+    parser.add_argument('--replay-end', help='End of the backtest query_range (default: now)')
+    parser.add_argument('--replay-step', default='30s', help='Step of the backtest query_range')
+    parser.add_argument('--replay-output', help='CSV file receiving every scored backtest point')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Fork this many workers sharing the loaded models, each polling a shard of the edges '
+                             '(requires PROMETHEUS_MULTIPROC_DIR to name an existing directory)')
+    parser.add_argument('--sample-store', default=os.environ.get('SAMPLE_STORE_DIR'),
+                        help='Directory of the local sample store: polled datapoints are appended to it, and '
+                             'retraining and --replay-start read their history from it instead of Prometheus')
+    parser.add_argument('--sample-retention', type=float, default=7 * 86400,
+                        help='Seconds of samples kept per series in the sample store')
+    parser.add_argument('--push-url', default=os.environ.get('INCIDENT_DETECTOR_URL'),
+                        help="Incident detector ingest endpoint (like http://detector:8083/ingest) the anomalies "
+                             "of every tick are pushed to as soon as they are scored (default: INCIDENT_DETECTOR_URL)")
+    parser.add_argument('--retrain-interval', type=float, default=0,
+                        help='Seconds between background refits on recent Prometheus data (0 disables)')
+    parser.add_argument('--retrain-window', type=float, default=3600,
+                        help='Seconds of history each background refit is trained and validated on')
+    parser.add_argument('--retrain-step', default='30s', help='Step of the retraining query_range')
+    parser.add_argument('--retrain-tolerance', type=float, default=0.1,
+                        help='Relative holdout MAE increase, and interval coverage shortfall, a retrained model may '
+                             'have and still be swapped in')
+
     # Add debug print to verify arguments
     args = parser.parse_args()
+    if args.source_service or args.destination_service or args.training_file:
+        if not (args.source_service and args.destination_service and args.training_file):
+            parser.error('source_service, destination_service and training_file must be given together')
+        args.edges.insert(0, Edge(args.source_service, args.destination_service, args.training_file))
+    if args.edges_config:
+        args.edges.extend(load_edges_config(args.edges_config))
+    if not args.edges:
+        parser.error('no edges to monitor, pass SOURCE DESTINATION TRAINING_FILE, --edge or --edges-config')
+
     print(f"Debug: Parsed Arguments:", flush=True)
-    print(f"Source Service: {args.source_service}", flush=True)
-    print(f"Destination Service: {args.destination_service}", flush=True)
-    print(f"Training File: {args.training_file}", flush=True)
+    for edge in args.edges:
+        print(f"Edge: {edge_name(edge)} (Training File: {edge.training_file})", flush=True)
     print(f"Port: {args.port}", flush=True)
     print(f"Prometheus URL: {args.prometheus_url}", flush=True)
-    
+    print(f"Model Cache Dir: {args.model_cache_dir}", flush=True)
+    print(f"Serving Mode: {args.serving}", flush=True)
+    print(f"Quiet: {args.quiet}", flush=True)
+    print(f"Tick Interval: {args.tick_interval}s (offset {args.tick_offset}s, overrun {args.overrun})", flush=True)
+    print(f"Fetch Mode: {args.fetch}", flush=True)
+    print(f"Engine: {args.engine}", flush=True)
+    print(f"Workers: {args.workers}", flush=True)
+    print(f"Forecaster: {args.forecaster}", flush=True)
+    print(f"Interval: {args.interval}", flush=True)
+    print(f"Uncertainty Samples: {args.uncertainty_samples}", flush=True)
+    print(f"Retrain Interval: {args.retrain_interval}", flush=True)
+    print(f"Sample Store: {args.sample_store}", flush=True)
+    print(f"Push URL: {args.push_url}", flush=True)
+
     return args
 
-def load_training_data(training_file):
+def seconds_to_ds(seconds):
+    """Same naive local times as datetime.fromtimestamp(), converted in one vectorized step"""
+    import pandas as pd
+    utc_offset = (datetime.fromtimestamp(0) - datetime(1970, 1, 1)).total_seconds()
+    return pd.to_datetime(np.asarray(seconds, dtype=np.float64) + utc_offset, unit='s')
+
+def load_training_data(training_file, cache_dir=None):
     """Load and prepare training data with proper time alignment"""
+    import pandas as pd
     try:
-        with open(training_file) as f:
-            prom = json.load(f)
+        timestamps, values = load_series(training_file, cache_dir)
+        valid = ~np.isnan(values)
+        timestamps, values = timestamps[valid], values[valid]
         
-        metric_data = prom['data']['result'][0]['values']
-        df_train = pd.DataFrame(metric_data, columns=['ds', 'y'])
-        df_train['y'] = pd.to_numeric(df_train['y'], errors='coerce')
-        df_train.dropna(subset=['y'], inplace=True)
-        
-        df_train['ds'] = df_train['ds'] - df_train['ds'].iloc[0]
-        df_train['ds'] = df_train['ds'].apply(lambda sec: datetime.fromtimestamp(sec))
+        df_train = pd.DataFrame({
+            'ds': seconds_to_ds(timestamps - timestamps[0]),
+            'y': values
+        })
         
         return df_train
     except Exception as e:
         print(f"Error loading training data: {e}", flush=True)
         raise
 
-def initialize_model(df_train):
-    """Initialize and train Prophet model with hourly seasonality"""
-    model = Prophet(
-        interval_width=0.99,
-        yearly_seasonality=False,
-        weekly_seasonality=False,
-        daily_seasonality=False,
-        growth='flat'
-    )
-    model.add_seasonality(name='hourly', period=1/24, fourier_order=5)
+def initialize_model(df_train, params=MODEL_PARAMS, forecaster='prophet'):
+    """Initialize and train a flat-growth model with hourly seasonality"""
+    model = build_forecaster(forecaster, params)
     model.fit(df_train)
     return model
 
+def get_model(training_file, model_cache_dir=None, params=MODEL_PARAMS, forecaster='prophet'):
+    """Load the fitted model from the artifact cache, fitting and caching it on a miss"""
+    path = artifact_path(model_cache_dir, training_file, params, forecaster) if model_cache_dir else None
+    if path:
+        model = load_model(path, forecaster)
+        if model is not None:
+            print(f"Loaded model artifact {path}", flush=True)
+            return model
+
+    print(f"Training {forecaster} model from {training_file}", flush=True)
+    start = time.perf_counter()
+    df_train = load_training_data(training_file, model_cache_dir)
+    model = initialize_model(df_train, params, forecaster)
+    print(f"Trained in {time.perf_counter() - start:.3f}s", flush=True)
+    report_intervals(model, df_train, params['interval_method'])
+    if path:
+        try:
+            save_model(model, path, forecaster)
+            print(f"Saved model artifact {path}", flush=True)
+        except OSError as e:
+            print(f"Could not save model artifact {path}: {e}", flush=True)
+    return model
+
 def setup_prometheus_metrics(source_service, destination_service):
-    """Setup Prometheus metrics with prefixed and service-specific names"""
+    """Setup Prometheus metrics with prefixed and service-specific names, one series per latency quantile"""
     prefix = f'lab7_{source_service}_2_{destination_service}'
+    # Only read in pre-fork mode: the worker owning the edge holds the live value, a dead worker's value is dropped
+    gauge = partial(Gauge, multiprocess_mode='livemostrecent')
     return {
-        'anomaly_count': Gauge(f'{prefix}_anomaly_count', 'Number of detected anomalies'),
-        'mae_score': Gauge(f'{prefix}_mae_score', 'Mean Absolute Error (MAE)'),
-        'mape_score': Gauge(f'{prefix}_mape_score', 'Mean Absolute Percentage Error (MAPE)'),
-        'current_value': Gauge(f'{prefix}_current_value', 'Current observed value'),
-        'predicted_value': Gauge(f'{prefix}_predicted_value', 'Predicted value by Prophet'),
-        'yhat_min': Gauge(f'{prefix}_yhat_min', 'Lower bound of prediction'),
-        'yhat_max': Gauge(f'{prefix}_yhat_max', 'Upper bound of prediction')
+        'anomaly_count': gauge(f'{prefix}_anomaly_count', 'Number of detected anomalies', ['quantile']),
+        'mae_score': gauge(f'{prefix}_mae_score', 'Mean Absolute Error (MAE)', ['quantile']),
+        'mape_score': gauge(f'{prefix}_mape_score', 'Mean Absolute Percentage Error (MAPE)', ['quantile']),
+        'current_value': gauge(f'{prefix}_current_value', 'Current observed value', ['quantile']),
+        'predicted_value': gauge(f'{prefix}_predicted_value', 'Predicted value by the forecaster', ['quantile']),
+        'yhat_min': gauge(f'{prefix}_yhat_min', 'Lower bound of prediction', ['quantile']),
+        'yhat_max': gauge(f'{prefix}_yhat_max', 'Upper bound of prediction', ['quantile'])
     }
 
 # def fetch_current_data(prometheus_url, source_service, destination_service):
@@ -107,32 +292,116 @@ def setup_prometheus_metrics(source_service, destination_service):
 #         return None, None
 
 
-def fetch_current_data(prometheus_url, source_service, destination_service):
+def build_bucket_query(selector):
+    """Per-pair latency bucket rates, the quantiles are computed from them client side by lab7_common.histogram"""
+    return (f"sum by (le, source_app, destination_app)"
+            f"(rate(istio_request_duration_milliseconds_bucket{{{selector}}}[1m]))")
+
+def fetch_current_data(client, source_service, destination_service, quantiles=(0.5,), timeout=None):
+    """Fetch the current datapoint of every quantile of one service pair, keyed by (source, destination, quantile)"""
     # Add more explicit debugging
     print(f"Attempting to fetch data with:", flush=True)
     print(f"Source Service: {source_service}", flush=True)
     print(f"Destination Service: {destination_service}", flush=True)
     
-    query = f"histogram_quantile(0.5, sum(rate(istio_request_duration_milliseconds_bucket{{source_app='{source_service}', destination_app='{destination_service}', reporter='source'}}[1m])) by (le))"
+    query = build_bucket_query(f"source_app='{source_service}', destination_app='{destination_service}', "
+                               f"reporter='source'")
     
     print(f"Generated Prometheus Query: {query}", flush=True)
     
     try:
-        response = requests.get(f'{prometheus_url}/api/v1/query', params={'query': query})
-        response.raise_for_status()
-        data = response.json()['data']['result']
+        stats = {}
+        data = client.query(query, timeout=timeout, stats=stats)
+        observe_query(f"{source_service}->{destination_service}", stats)
         
-        print(f"Prometheus Response: {data}", flush=True)
+        print(f"Prometheus returned {len(data)} series", flush=True)
         
         if not data:
             print(f"No data returned for {source_service}->{destination_service}", flush=True)
-            return None, None
+            return {}
         
-        timestamp, value = data[0]['value']
-        return float(timestamp), float(value)
+        return vector_quantiles(data, quantiles)
     except Exception as e:
         print(f"Error in fetch_current_data: {e}", flush=True)
-        return None, None
+        return {}
+
+def build_batch_query(edges):
+    """Build one grouped bucket rate query covering every edge, whatever quantiles are monitored on it"""
+    sources = '|'.join(sorted({edge.source for edge in edges}))
+    destinations = '|'.join(sorted({edge.destination for edge in edges}))
+    return build_bucket_query(f"source_app=~'{sources}', destination_app=~'{destinations}', reporter='source'")
+
+def fetch_edges_data(client, edges, timeout=None):
+    """Fetch the current datapoint of every edge with a single query, keyed by (source, destination, quantile)"""
+    query = build_batch_query(edges)
+    print(f"Generated Prometheus Query: {query}", flush=True)
+
+    try:
+        stats = {}
+        data = client.query(query, timeout=timeout, stats=stats)
+        observe_query('batch', stats)
+    except Exception as e:
+        print(f"Error in fetch_edges_data: {e}", flush=True)
+        return {}
+
+    # The regex selectors can match pairs that are not monitored, those are dropped later
+    samples = vector_quantiles(data, sorted({edge.quantile for edge in edges}))
+    print(f"Prometheus returned {len(data)} bucket series for {len(edges)} edges", flush=True)
+    return samples
+
+def collect_samples(edge_monitors, data):
+    """Pair each edge monitor with its fetched datapoint, skipping edges without data"""
+    samples = []
+    for edge_monitor in edge_monitors:
+        edge = edge_monitor['edge']
+        timestamp, value = data.get(edge_key(edge), (None, None))
+        if value is None:
+            print(f"Failed to fetch data for {edge_name(edge)}, skipping this tick...", flush=True)
+            FETCH_FAILURES.labels(edge_label(edge)).inc()
+            continue
+        if edge_monitor['store'] is not None:
+            # The store only feeds retraining and replays, a full disk or a damaged file must not stop scoring
+            try:
+                edge_monitor['store'].append(edge_name(edge), timestamp, value)
+            except (OSError, ValueError) as e:
+                print(f"Error appending {edge_name(edge)} to the sample store: {e}", flush=True)
+                STORE_FAILURES.labels(edge_label(edge)).inc()
+        samples.append((edge_monitor, timestamp, value))
+    return samples
+
+def fetch_samples(edge_monitors, client, fetch_mode='batch', query_timeout=10):
+    """Fetch the current datapoint of every monitored edge, one query per tick or per service pair"""
+    edges = [m['edge'] for m in edge_monitors]
+    if fetch_mode == 'batch':
+        data = fetch_edges_data(client, edges, query_timeout)
+    else:
+        data = {}
+        # The pairs run one after another, so they share one deadline: a slow pair can delay the others by at
+        # most query_timeout in total, and the pairs left when it passes are retried next tick
+        deadline = time.monotonic() + query_timeout
+        for (source, destination), quantiles in edge_pairs(edges).items():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                print(f"Tick fetch deadline passed, skipping {source}->{destination}", flush=True)
+                continue
+            data.update(fetch_current_data(client, source, destination, quantiles, remaining))
+    return collect_samples(edge_monitors, data)
+
+async def fetch_samples_async(edge_monitors, client, poller, fetch_mode='batch'):
+    """Fetch the current datapoint of every monitored edge, running per-pair queries concurrently"""
+    edges = [m['edge'] for m in edge_monitors]
+    if fetch_mode == 'batch':
+        calls = [(fetch_edges_data, (client, edges))]
+    else:
+        calls = [(fetch_current_data, (client, source, destination, quantiles))
+                 for (source, destination), quantiles in edge_pairs(edges).items()]
+    data = {}
+    for result in await poller.fetch_all(calls):
+        if isinstance(result, Exception):
+            print(f"Error in fetch_samples_async: {result!r}", flush=True)
+            continue
+        data.update(result)
+    return collect_samples(edge_monitors, data)
 
 def print_phase_header(phase_name):
     """Print a clearly visible phase header"""
@@ -142,115 +411,504 @@ def print_phase_header(phase_name):
     print(f"Timestamp: {datetime.now()}", flush=True)
     print(f"{border}\n", flush=True)
 
-def print_results(df_results, window=5):
+def print_results(history, title="Monitoring Results"):
     """Print results in a formatted table"""
-    headers = ['Timestamp', 'Actual', 'Predicted', 'Lower Bound', 'Upper Bound', 'Anomaly', 'MAE', 'MAPE']
-    print("\nMonitoring Results:", flush=True)
-    print(tabulate(df_results.tail(window)[headers], headers=headers, 
-                  tablefmt='grid', floatfmt='.3f', showindex=False), flush=True)
+    from tabulate import tabulate
+    headers = ['Timestamp'] + RESULT_COLUMNS
+    rows = [[datetime.fromtimestamp(ts)] + values for ts, values in history.tail(history.window)]
+    print(f"\n{title}:", flush=True)
+    floatfmt = ['.3f' if column != 'Anomaly' else '.0f' for column in headers]
+    print(tabulate(rows, headers=headers, 
+                  tablefmt='grid', floatfmt=floatfmt, showindex=False), flush=True)
     
     # Print summary statistics
-    anomaly_count = df_results.tail(window)['Anomaly'].sum()
-    avg_mae = df_results.tail(window)['MAE'].mean()
-    avg_mape = df_results.tail(window)['MAPE'].mean()
+    anomaly_count = int(history.window_sum('Anomaly'))
+    avg_mae = history.window_mean('MAE')
+    avg_mape = history.window_mean('MAPE')
 
     print("\nWindow Summary:", flush=True)
     print(f"Total Anomalies: {anomaly_count}", flush=True)
     print(f"Average MAE: {avg_mae:.3f}", flush=True)
     print(f"Average MAPE: {avg_mape:.3f}\n", flush=True)
 
-def monitor(source_service, destination_service, training_file, port, prometheus_url):
-    """Main monitoring function with generalized parameters"""
-    print_phase_header("STARTUP - Loading Model")
-    df_train = load_training_data(training_file)
-    model = initialize_model(df_train)
-    metrics = setup_prometheus_metrics(source_service, destination_service)
-    
-    # Start Prometheus server with dynamic port
-    start_http_server(port)
-    results = []
-    test_start_time = time.time()
-    
-    print_phase_header(f"NORMAL OPERATION - Monitoring {source_service}->{destination_service}")
-    print("Monitor started - waiting for initial data points...", flush=True)
-    
-    iteration = 0
-    current_phase = "normal"
-    while True:
-        timestamp, value = fetch_current_data(prometheus_url, source_service, destination_service)
-        if value is None:
-            print(f"Failed to fetch data for {source_service}->{destination_service}, retrying in 60 seconds...", flush=True)
-            time.sleep(60)
-            continue
-            
-        # Phase transition logic (optional, can be customized)
-        if iteration == 10 and current_phase == "normal":
-            print_phase_header("DELAY INJECTION PHASE")
-            current_phase = "delay"
-        elif iteration == 20 and current_phase == "delay":
-            print_phase_header("RECOVERY PHASE")
-            current_phase = "recovery"
-            
-        # Create aligned test datapoint
-        current_time = timestamp - test_start_time
-        df_test = pd.DataFrame({
-            'ds': [datetime.fromtimestamp(current_time)],
-            'y': [value]
+def load_edge_models(edges, model_cache_dir=None, forecaster='prophet', params=MODEL_PARAMS):
+    """Load one model per distinct training file"""
+    models = {}
+    for edge in edges:
+        if edge.training_file not in models:
+            models[edge.training_file] = get_model(edge.training_file, model_cache_dir, params, forecaster)
+    return models
+
+def build_forecast_tables(models, step, params=MODEL_PARAMS):
+    """Evaluate each model once over one seasonality period"""
+    period = params['seasonality_period'] * 24 * 3600
+    tables = {}
+    for training_file, model in models.items():
+        start = time.perf_counter()
+        tables[training_file] = ForecastTable.from_model(model, period, step)
+        print(f"Built forecast table for {training_file} "
+              f"({tables[training_file].size} points in {time.perf_counter() - start:.2f}s)", flush=True)
+    return tables
+
+def load_edge_serving(edges, model_cache_dir=None, serving='predict', table_step=10, forecaster='prophet',
+                      params=MODEL_PARAMS):
+    """ServingModel per distinct training file, from prebuilt table artifacts when serving tables"""
+    paths = {}
+    if serving == 'table' and model_cache_dir:
+        paths = {edge.training_file: table_path(model_cache_dir, edge.training_file, params, forecaster, table_step)
+                 for edge in edges}
+        # Tables fully replace the models, so a warm cache never loads a model or the modelling libraries
+        if all(os.path.exists(path) for path in paths.values()):
+            for path in set(paths.values()):
+                print(f"Loaded forecast table {path}", flush=True)
+            return {training_file: ServingModel(None, ForecastTable.load(path))
+                    for training_file, path in paths.items()}
+
+    models = load_edge_models(edges, model_cache_dir, forecaster, params)
+    tables = build_forecast_tables(models, table_step, params) if serving == 'table' else {}
+    for training_file, path in paths.items():
+        try:
+            tables[training_file].save(path)
+            print(f"Saved forecast table {path}", flush=True)
+        except OSError as e:
+            print(f"Could not save forecast table {path}: {e}", flush=True)
+    return {training_file: ServingModel(model, tables.get(training_file)) for training_file, model in models.items()}
+
+def setup_edge_monitors(edges, model_cache_dir=None, serving='predict', table_step=10, history_size=1440,
+                        forecaster='prophet', params=MODEL_PARAMS, servings=None, store=None):
+    """Load one model and one set of metrics per edge, sharing models between edges with the same training file"""
+    if servings is None:
+        servings = load_edge_serving(edges, model_cache_dir, serving, table_step, forecaster, params)
+    pair_metrics = {}
+    edge_monitors = []
+    for edge in edges:
+        # Quantiles of a pair share its gauges, each one writing the series of its quantile label
+        if (edge.source, edge.destination) not in pair_metrics:
+            pair_metrics[(edge.source, edge.destination)] = setup_prometheus_metrics(edge.source, edge.destination)
+        metrics = pair_metrics[(edge.source, edge.destination)]
+        edge_monitors.append({
+            'edge': edge,
+            'serving': servings[edge.training_file],
+            'forecaster': forecaster,
+            'params': params,
+            'metrics': {name: gauge.labels(quantile=f"{edge.quantile:g}") for name, gauge in metrics.items()},
+            'history': RingHistory(RESULT_COLUMNS, history_size),
+            'store': store
         })
-        
-        # Make prediction
+    return edge_monitors
+
+def predict_point(edge_monitor, current_time):
+    """(yhat, yhat_lower, yhat_upper) of the edge model at a time in seconds since the monitor started"""
+    model, table = edge_monitor['serving']
+    with timed(PREDICT_SECONDS, edge_label(edge_monitor['edge'])):
+        if table is not None:
+            return table.lookup(current_time)
+        import pandas as pd
+        df_test = pd.DataFrame({'ds': [datetime.fromtimestamp(current_time)]})
         forecast = model.predict(df_test)
-        predicted_value = forecast['yhat'].values[0]
-        lower_bound = forecast['yhat_lower'].values[0]
-        upper_bound = forecast['yhat_upper'].values[0]
-        
-        # Detect anomaly
-        is_anomaly = value < lower_bound or value > upper_bound
-        anomaly_count = 1 if is_anomaly else 0
-        
-        # Calculate metrics
-        if not (pd.isna(value) or pd.isna(predicted_value)):
-            mae = mean_absolute_error([value], [predicted_value])
-            mape = mean_absolute_percentage_error([value], [predicted_value])
-        else:
-            mae = mape = float('nan')
-            
+        return forecast['yhat'].values[0], forecast['yhat_lower'].values[0], forecast['yhat_upper'].values[0]
+
+def score_arrays(values, predicted, lower, upper):
+    """Anomaly flags and per-point MAE/MAPE (sklearn's definitions) of observed values against forecasts"""
+    anomaly = ((values < lower) | (values > upper)).astype(np.float64)
+    mae = np.abs(values - predicted)
+    mape = mae / np.maximum(np.abs(values), EPSILON)
+    return {
+        'Actual': values, 'Predicted': predicted, 'Lower Bound': lower, 'Upper Bound': upper,
+        'Anomaly': anomaly, 'MAE': mae, 'MAPE': mape
+    }
+
+def update_edge(edge_monitor, row):
+    """Publish one scored RESULT_COLUMNS row of an edge to its gauges and history"""
+    value, predicted_value, lower_bound, upper_bound, anomaly_count, mae, mape = row
+    metrics = edge_monitor['metrics']
+    with timed(METRIC_UPDATE_SECONDS, edge_label(edge_monitor['edge'])):
         # Update Prometheus metrics
         metrics['anomaly_count'].set(anomaly_count)
         metrics['current_value'].set(value)
         metrics['predicted_value'].set(predicted_value)
         metrics['yhat_min'].set(lower_bound)
         metrics['yhat_max'].set(upper_bound)
-        if not pd.isna(mae):
+        if not math.isnan(mae):
             metrics['mae_score'].set(mae)
             metrics['mape_score'].set(mape)
             
         # Store results
-        results.append({
-            'Timestamp': datetime.now(),
-            'Actual': value,
-            'Predicted': predicted_value,
-            'Lower Bound': lower_bound,
-            'Upper Bound': upper_bound,
-            'Anomaly': anomaly_count,
-            'MAE': mae,
-            'MAPE': mape
-        })
+        edge_monitor['history'].append(time.time(), row)
+
+def score_edge_batch(serving, timestamps, values, test_start_time):
+    """Score a whole series against a serving model in one vectorized pass"""
+    model, table = serving
+    current_times = timestamps - test_start_time
+
+    if table is not None:
+        predicted, lower, upper = table.lookup_many(current_times)
+    else:
+        import pandas as pd
+        df_test = pd.DataFrame({'ds': seconds_to_ds(current_times)})
+        forecast = model.predict(df_test)
+        predicted = forecast['yhat'].values
+        lower = forecast['yhat_lower'].values
+        upper = forecast['yhat_upper'].values
+
+    return score_arrays(values, predicted, lower, upper)
+
+def load_replay_series(edges, replay_file):
+    """Load recorded series from a Prometheus query_range JSON file, keyed by (source, destination, quantile)"""
+    with open(replay_file) as f:
+        result = json.load(f)['data']['result']
+    series = {}
+    for edge in edges:
+        matching = [r for r in result if series_key(r['metric']) == edge_key(edge)]
+        # A single unlabelled series, like the `sum by (le)` training exports, belongs to the only edge
+        if not matching and len(result) == 1 and len(edges) == 1:
+            matching = result
+        if matching:
+            series[edge_key(edge)] = values_to_arrays(matching[0]['values'])
+    return series
+
+def fetch_replay_series(client, edges, start, end, step):
+    """Fetch the history of every edge with one grouped query_range, keyed by (source, destination, quantile)"""
+    result = client.query_range(build_batch_query(edges), start, end, step)
+    series = {}
+    for key, (timestamps, values) in matrix_quantiles(result, sorted({edge.quantile for edge in edges})).items():
+        # Steps where the pair had no traffic come back as NaN, Prometheus drops those points
+        keep = ~np.isnan(values)
+        series[key] = (timestamps[keep], values[keep])
+    return series
+
+def read_store_series(store, edges, start, end):
+    """Recorded samples of the edges within [start, end] from the local sample store, keyed like fetched series"""
+    series = {}
+    for edge in edges:
+        timestamps, values = store.read(edge_name(edge), start, end)
+        if len(timestamps):
+            series[edge_key(edge)] = timestamps, values
+    return series
+
+def store_covers(store, edge, start, end, max_gap):
+    """Whether the store holds an edge's samples over all of [start, end], no two more than max_gap apart"""
+    # A sample before start is not enough, hours missing inside the window would silently thin the training data
+    timestamps, _ = store.read(edge_name(edge), start - max_gap, end)
+    if not len(timestamps) or timestamps[0] > start or end - timestamps[-1] > max_gap:
+        return False
+    return float(np.max(np.diff(timestamps), initial=0)) <= max_gap
+
+def replay(edges, series, model_cache_dir=None, serving='predict', table_step=10, output=None,
+           forecaster='prophet', params=MODEL_PARAMS):
+    """Backtest every edge over a recorded series and print the same anomaly/MAE/MAPE outputs as monitor()"""
+    from tabulate import tabulate
+    print_phase_header("REPLAY - Loading Model")
+    servings = load_edge_serving(edges, model_cache_dir, serving, table_step, forecaster, params)
+
+    summary = []
+    rows = []
+    for edge in edges:
+        if edge_key(edge) not in series:
+            print(f"No replay data for {edge_name(edge)}, skipping...", flush=True)
+            continue
+        timestamps, values = series[edge_key(edge)]
+        valid = ~np.isnan(values)
+        timestamps, values = timestamps[valid], values[valid]
+        if len(values) == 0:
+            print(f"Replay data for {edge_name(edge)} is empty, skipping...", flush=True)
+            continue
+
+        start = time.perf_counter()
+        # The replayed monitor "starts" at the first recorded point, as a live monitor would
+        scores = score_edge_batch(servings[edge.training_file], timestamps, values, timestamps[0])
+        elapsed = time.perf_counter() - start
+
+        anomalies = int(scores['Anomaly'].sum())
+        summary.append([edge_name(edge), len(values), anomalies, 1 - anomalies / len(values),
+                        float(scores['MAE'].mean()), float(scores['MAPE'].mean()), elapsed])
+        for k, ts in enumerate(timestamps):
+            rows.append([edge.source, edge.destination, edge.quantile, datetime.fromtimestamp(ts)]
+                        + [float(scores[column][k]) for column in RESULT_COLUMNS])
+
+    print("\nReplay Summary:", flush=True)
+    print(tabulate(summary, headers=['Edge', 'Points', 'Anomalies', 'Coverage', 'Average MAE', 'Average MAPE',
+                                     'Seconds'], tablefmt='grid', floatfmt='.3f'), flush=True)
+    if output:
+        with open(output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Source', 'Destination', 'Quantile', 'Timestamp'] + RESULT_COLUMNS)
+            writer.writerows(rows)
+        print(f"Wrote {len(rows)} scored points to {output}", flush=True)
+    return summary
+
+def score_samples(samples, test_start_time, quiet=False, pusher=None):
+    """Score the fetched datapoints of every edge and quantile in one vectorized pass, then publish and print them"""
+    if not samples:
+        return
+    # Aligned test datapoints
+    forecasts = np.array([predict_point(edge_monitor, timestamp - test_start_time)
+                          for edge_monitor, timestamp, _ in samples], dtype=np.float64).reshape(-1, 3)
+    values = np.array([value for _, _, value in samples], dtype=np.float64)
+    scores = score_arrays(values, forecasts[:, 0], forecasts[:, 1], forecasts[:, 2])
+
+    for k, (edge_monitor, _, _) in enumerate(samples):
+        row = [float(scores[column][k]) for column in RESULT_COLUMNS]
+        update_edge(edge_monitor, row)
         
         # Print results with phase-specific summary
-        df_results = pd.DataFrame(results)
-        print_results(df_results)
+        edge = edge_monitor['edge']
+        if quiet:
+            print(f"{edge_name(edge)}: " + ", ".join(
+                f"{column}={value:.3f}" for column, value in zip(RESULT_COLUMNS, row)), flush=True)
+            continue
+        print_results(edge_monitor['history'], title=f"Monitoring Results {edge_name(edge)}")
+
+    if pusher is not None:
+        # Straight to the incident detector, without waiting for the gauges to be scraped
+        pusher.push(anomaly_events((edge_monitor['edge'], float(scores['Anomaly'][k]))
+                                   for k, (edge_monitor, _, _) in enumerate(samples)))
+
+def next_phase(iteration, current_phase):
+    """Phase transition logic (optional, can be customized)"""
+    if iteration == 10 and current_phase == "normal":
+        print_phase_header("DELAY INJECTION PHASE")
+        return "delay"
+    if iteration == 20 and current_phase == "delay":
+        print_phase_header("RECOVERY PHASE")
+        return "recovery"
+    return current_phase
+
+def retrain_edge(edge_monitor, timestamps, values, test_start_time, table_step=10, tolerance=0.1,
+                 holdout_fraction=0.2):
+    """Refit an edge model on recent data and swap it in if it does at least as well on a holdout"""
+    import pandas as pd
+    edge = edge_monitor['edge']
+    valid = ~np.isnan(values)
+    timestamps, values = timestamps[valid], values[valid]
+    current = edge_monitor['serving']
+    interval_width = edge_monitor['params']['interval_width']
+
+    # Points the current model flags are an incident, not a new baseline: they are left out of the fit, and a
+    # window with more of them than the interval lets through is not retrained on at all
+    anomalous = score_edge_batch(current, timestamps, values, test_start_time)['Anomaly'] > 0
+    if len(values) and anomalous.mean() > (1 - interval_width) + tolerance:
+        print(f"Not retraining {edge_name(edge)}: {anomalous.mean():.0%} of the window is anomalous", flush=True)
+        return False
+    timestamps, values = timestamps[~anomalous], values[~anomalous]
+
+    split = int(len(values) * (1 - holdout_fraction))
+    if split < 10 or len(values) - split < 2:
+        print(f"Not enough recent data to retrain {edge_name(edge)}", flush=True)
+        return False
+
+    # Train on the monitor's clock so the seasonal phase lines up with live scoring
+    df_train = pd.DataFrame({'ds': seconds_to_ds(timestamps[:split] - test_start_time), 'y': values[:split]})
+    model = initialize_model(df_train, edge_monitor['params'], edge_monitor['forecaster'])
+    table = ForecastTable.from_model(model, current.table.period, table_step) if current.table else None
+    candidate = ServingModel(model, table)
+
+    holdout = timestamps[split:], values[split:]
+    candidate_scores = score_edge_batch(candidate, *holdout, test_start_time)
+    candidate_mae = float(np.mean(candidate_scores['MAE']))
+    current_mae = float(np.mean(score_edge_batch(current, *holdout, test_start_time)['MAE']))
+    # A collapsed interval can win on MAE and then flag every tick, so its holdout coverage must hold up too
+    coverage = interval_coverage(holdout[1], candidate_scores['Lower Bound'], candidate_scores['Upper Bound'])
+    accepted = candidate_mae <= current_mae * (1 + tolerance) and coverage >= interval_width - tolerance
+    print(f"Retrained {edge_name(edge)}: holdout MAE {candidate_mae:.3f} vs current {current_mae:.3f}, "
+          f"coverage {coverage:.3f}, {'swapping in' if accepted else 'keeping current model'}", flush=True)
+    if accepted:
+        # A single dict assignment, so a scoring tick sees either the old or the new model
+        edge_monitor['serving'] = candidate
+    return accepted
+
+def retrain_loop(edge_monitors, client, test_start_time, interval, window, step='30s', table_step=10,
+                 tolerance=0.1, max_gap=180):
+    """Periodically refit every edge on a sliding window pulled from Prometheus"""
+    edges = [m['edge'] for m in edge_monitors]
+    store = edge_monitors[0]['store']
+    while True:
+        time.sleep(interval)
+        end = time.time()
+        # Windows the pollers already recorded are read locally, only the others cost a Prometheus query
+        local = [edge for edge in edges
+                 if store is not None and store_covers(store, edge, end - window, end, max_gap)]
+        series = read_store_series(store, local, end - window, end) if local else {}
+        remote = [edge for edge in edges if edge not in local]
+        try:
+            if remote:
+                series.update(fetch_replay_series(client, remote, end - window, end, step))
+        except Exception as e:
+            print(f"Error fetching retraining data: {e}", flush=True)
+            if not series:
+                continue
+        for edge_monitor in edge_monitors:
+            edge = edge_monitor['edge']
+            if edge_key(edge) not in series:
+                continue
+            try:
+                retrain_edge(edge_monitor, *series[edge_key(edge)], test_start_time,
+                             table_step, tolerance)
+            except Exception as e:
+                print(f"Error retraining {edge_name(edge)}: {e}", flush=True)
+
+def start_retrainer(edge_monitors, client, test_start_time, interval, window, step='30s', table_step=10,
+                    tolerance=0.1, max_gap=180):
+    """Run retrain_loop in a daemon thread, fits happen off the polling loop"""
+    thread = threading.Thread(target=retrain_loop, name='retrainer', daemon=True,
+                              args=(edge_monitors, client, test_start_time, interval, window, step,
+                                    table_step, tolerance, max_gap))
+    thread.start()
+    return thread
+
+async def monitor_async(edge_monitors, client, fetch_mode, test_start_time, max_concurrency, query_timeout,
+                        scheduler, quiet=False, pusher=None):
+    """Polling loop of the async engine, tick latency is bounded by the slowest single query"""
+    poller = AsyncPoller(max_concurrency, query_timeout)
+    iteration = 0
+    current_phase = "normal"
+    try:
+        while True:
+            await scheduler.wait_async()
+            with TICK_SECONDS.time():
+                samples = await fetch_samples_async(edge_monitors, client, poller, fetch_mode)
+                if not samples:
+                    print("Failed to fetch data for every edge, retrying next tick...", flush=True)
+                    continue
+
+                current_phase = next_phase(iteration, current_phase)
+                await poller.score(score_samples, samples, test_start_time, quiet, pusher)
+
+            iteration += 1
+    finally:
+        poller.close()
+
+def poll_edges(edge_monitors, prometheus_url, test_start_time, fetch_mode='batch', query_timeout=10,
+               engine='sync', max_concurrency=8, retrain_interval=0, retrain_window=3600, retrain_step='30s',
+               retrain_tolerance=0.1, table_step=10, quiet=False, tick_interval=60, tick_offset=0, overrun='skip',
+               push_url=None):
+    """Fetch, score and publish the edge monitors every tick, forever"""
+    client = PrometheusClient(prometheus_url, timeout=query_timeout, pool_size=max_concurrency)
+    
+    edge_names = ', '.join(edge_name(m['edge']) for m in edge_monitors)
+    print_phase_header(f"NORMAL OPERATION - Monitoring {edge_names}")
+    print("Monitor started - waiting for initial data points...", flush=True)
+    
+    if retrain_interval > 0:
+        # Own client, so retraining queries never hold the polling loop's connections
+        start_retrainer(edge_monitors, PrometheusClient(prometheus_url, timeout=max(query_timeout, 60)),
+                        test_start_time, retrain_interval, retrain_window, retrain_step, table_step,
+                        retrain_tolerance, max_gap=3 * tick_interval)
+    
+    pusher = AnomalyPusher(push_url) if push_url else None
+    scheduler = DeadlineScheduler(tick_interval, tick_offset, overrun)
+    if engine == 'async':
+        asyncio.run(monitor_async(edge_monitors, client, fetch_mode, test_start_time,
+                                  max_concurrency, query_timeout, scheduler, quiet, pusher))
+        return
+
+    iteration = 0
+    current_phase = "normal"
+    while True:
+        scheduler.wait()
+        with TICK_SECONDS.time():
+            samples = fetch_samples(edge_monitors, client, fetch_mode, query_timeout)
+            if not samples:
+                print("Failed to fetch data for every edge, retrying next tick...", flush=True)
+                continue
+                
+            current_phase = next_phase(iteration, current_phase)
+            score_samples(samples, test_start_time, quiet, pusher)
         
         iteration += 1
-        time.sleep(60)
+
+def monitor(edges, port, prometheus_url, model_cache_dir=None, serving='predict', table_step=10,
+            history_size=1440, fetch_mode='batch', query_timeout=10, engine='sync', max_concurrency=8,
+            retrain_interval=0, retrain_window=3600, retrain_step='30s', retrain_tolerance=0.1,
+            forecaster='prophet', params=MODEL_PARAMS, quiet=False, tick_interval=60, tick_offset=0,
+            overrun='skip', workers=1, sample_store=None, sample_retention=None, push_url=None):
+    """Main monitoring function, watching every edge from a single process or from pre-forked workers"""
+    print_phase_header("STARTUP - Loading Model")
+    poll_args = dict(fetch_mode=fetch_mode, query_timeout=query_timeout, engine=engine,
+                     max_concurrency=max_concurrency, retrain_interval=retrain_interval,
+                     retrain_window=retrain_window, retrain_step=retrain_step, retrain_tolerance=retrain_tolerance,
+                     table_step=table_step, quiet=quiet, tick_interval=tick_interval, tick_offset=tick_offset,
+                     overrun=overrun, push_url=push_url)
+    if workers > 1:
+        # Loaded once here and inherited by every worker, restarted workers included
+        servings = load_edge_serving(edges, model_cache_dir, serving, table_step, forecaster, params)
+        # Shared so every worker, and a restarted one, scores on the same seasonal phase
+        test_start_time = time.time()
+
+        def run_worker(worker, shard):
+            # Opened in the worker, each series file then has a single writer
+            store = SampleStore(sample_store, sample_retention) if sample_store else None
+            edge_monitors = setup_edge_monitors(shard, model_cache_dir, serving, table_step, history_size,
+                                                forecaster, params, servings, store)
+            poll_edges(edge_monitors, prometheus_url, test_start_time, **poll_args)
+
+        shards = shard_edges(edges, workers)
+        print(f"Forking {len(shards)} worker(s) for {len(edges)} edge(s)", flush=True)
+        Supervisor(run_worker, shards, port).run()
+        return
+
+    store = SampleStore(sample_store, sample_retention) if sample_store else None
+    edge_monitors = setup_edge_monitors(edges, model_cache_dir, serving, table_step, history_size, forecaster,
+                                        params, store=store)
+    
+    # Start Prometheus server with dynamic port
+    start_http_server(port)
+    test_start_time = time.time()
+    poll_edges(edge_monitors, prometheus_url, test_start_time, **poll_args)
 
 if __name__ == "__main__":
     args = parse_arguments()
-    print(f"Starting monitor for {args.source_service}->{args.destination_service}")
+    params = dict(MODEL_PARAMS, interval_method=args.interval, uncertainty_samples=args.uncertainty_samples)
+    if args.build_artifacts:
+        if not args.model_cache_dir:
+            raise SystemExit("--build-artifacts requires --model-cache-dir or MODEL_CACHE_DIR")
+        load_edge_serving(args.edges, args.model_cache_dir, args.serving, args.table_step, args.forecaster, params)
+        raise SystemExit(0)
+    if args.replay_file or args.replay_start:
+        if args.replay_file:
+            series = load_replay_series(args.edges, args.replay_file)
+        else:
+            # Both sources take the same RFC 3339, unix or relative times
+            start, end = parse_time(args.replay_start), parse_time(args.replay_end or 'now')
+            if args.sample_store:
+                # Replays what the pollers recorded locally instead of querying Prometheus
+                series = read_store_series(SampleStore(args.sample_store), args.edges, start, end)
+            else:
+                client = PrometheusClient(args.prometheus_url, timeout=args.query_timeout)
+                series = fetch_replay_series(client, args.edges, start, end, args.replay_step)
+        replay(args.edges, series, args.model_cache_dir, args.serving, args.table_step, args.replay_output,
+               args.forecaster, params)
+        raise SystemExit(0)
+    if args.workers > 1:
+        if not multiprocess_dir():
+            raise SystemExit("--workers requires PROMETHEUS_MULTIPROC_DIR, an existing directory set before the "
+                             "monitor starts")
+        clear_multiprocess_dir(multiprocess_dir())
+    print(f"Starting monitor for {len(args.edges)} edge(s)")
     monitor(
-        args.source_service, 
-        args.destination_service, 
-        args.training_file, 
+        args.edges,
         args.port,
-        args.prometheus_url
-    )
\ No newline at end of file
+        args.prometheus_url,
+        model_cache_dir=args.model_cache_dir,
+        serving=args.serving,
+        table_step=args.table_step,
+        history_size=args.history_size,
+        fetch_mode=args.fetch,
+        query_timeout=args.query_timeout,
+        engine=args.engine,
+        max_concurrency=args.max_concurrency,
+        retrain_interval=args.retrain_interval,
+        retrain_window=args.retrain_window,
+        retrain_step=args.retrain_step,
+        retrain_tolerance=args.retrain_tolerance,
+        forecaster=args.forecaster,
+        params=params,
+        quiet=args.quiet,
+        tick_interval=args.tick_interval,
+        tick_offset=args.tick_offset,
+        overrun=args.overrun,
+        workers=args.workers,
+        sample_store=args.sample_store,
+        sample_retention=args.sample_retention,
+        push_url=args.push_url
+    )
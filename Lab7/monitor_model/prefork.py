@@ -0,0 +1,134 @@
+import gc
+import os
+import glob
+import time
+import signal
+import traceback
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+from prometheus_client import CollectorRegistry, make_wsgi_app, multiprocess
+from instrumentation import WORKER_RESTARTS
+
+# Pre-fork mode: the parent loads every model once, then forks one worker per shard of edges. Workers only
+# read the models, so their pages stay shared copy-on-write with the parent instead of being duplicated.
+# Workers write their metrics through prometheus_client's multiprocess mode, the parent serves the aggregate.
+
+def shard_edges(edges, workers):
+    """Split edges into at most `workers` shards, keeping every quantile of a pair in the same shard"""
+    pairs = {}
+    for edge in edges:
+        pairs.setdefault((edge.source, edge.destination), []).append(edge)
+    shards = [[] for _ in range(min(workers, len(pairs)))]
+    for i, pair_edges in enumerate(pairs.values()):
+        shards[i % len(shards)].extend(pair_edges)
+    return shards
+
+def multiprocess_dir():
+    """prometheus_client's metric directory, it must exist before prometheus_client is first imported"""
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+def clear_multiprocess_dir(path):
+    """Drop the metric files of previous runs, keeping the ones this process opened at import"""
+    for f in glob.glob(os.path.join(path, '*.db')):
+        if not f.endswith(f"_{os.getpid()}.db"):
+            os.remove(f)
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+class Supervisor:
+    """Forks one worker per shard, serves their aggregated metrics and restarts the ones that exit"""
+
+    def __init__(self, target, shards, port, max_backoff=60, stable_after=60):
+        self.target = target
+        self.shards = shards
+        self.port = port
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.pids = {}
+        self.started = {}
+        self.backoff = {worker: 0.0 for worker in range(len(shards))}
+        self.restart_at = {}
+        self.stopping = False
+        self.server = None
+
+    def spawn(self, worker):
+        pid = os.fork()
+        if pid == 0:
+            # The child must never return into the parent's supervision loop
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            if self.server:
+                self.server.socket.close()
+            code = 0
+            try:
+                self.target(worker, self.shards[worker])
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        print(f"Started worker {worker} (pid {pid}) for {len(self.shards[worker])} edge(s)", flush=True)
+        self.pids[pid] = worker
+        self.started[worker] = time.monotonic()
+
+    def reap(self):
+        """Collect exited workers and schedule their restart, backing off while they keep crashing"""
+        while self.pids:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            worker = self.pids.pop(pid, None)
+            if worker is None:
+                continue
+            multiprocess.mark_process_dead(pid)
+            if self.stopping:
+                continue
+            lifetime = time.monotonic() - self.started[worker]
+            self.backoff[worker] = 1.0 if lifetime >= self.stable_after else min(
+                max(1.0, self.backoff[worker] * 2), self.max_backoff)
+            print(f"Worker {worker} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)} "
+                  f"after {lifetime:.1f}s, restarting in {self.backoff[worker]:g}s", flush=True)
+            self.restart_at[worker] = time.monotonic() + self.backoff[worker]
+
+    def restart_due(self):
+        now = time.monotonic()
+        for worker, due in list(self.restart_at.items()):
+            if due <= now:
+                del self.restart_at[worker]
+                WORKER_RESTARTS.labels(str(worker)).inc()
+                self.spawn(worker)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def run(self):
+        """Supervise until SIGTERM/SIGINT, then stop every worker"""
+        # Move everything loaded so far out of the collector's reach, so a collection in a worker does not write
+        # to (and unshare) the pages holding the models
+        gc.collect()
+        gc.freeze()
+        for worker in range(len(self.shards)):
+            self.spawn(worker)
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        # Served from this thread between reaps, so later forks never copy a half-held lock of a server thread
+        server = self.server = make_server('', self.port, make_wsgi_app(registry), handler_class=_QuietHandler)
+        server.timeout = 1.0
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        try:
+            while not self.stopping:
+                server.handle_request()
+                self.reap()
+                self.restart_due()
+        finally:
+            server.server_close()
+            for pid in self.pids:
+                os.kill(pid, signal.SIGTERM)
+            while self.pids:
+                pid, _ = os.waitpid(-1, 0)
+                self.pids.pop(pid, None)
+                multiprocess.mark_process_dead(pid)
+            print("All workers stopped", flush=True)
@@ -0,0 +1,117 @@
+import json
+import argparse
+import numpy as np
+import pytest
+from lab7_common.prom_client import PrometheusError
+from export_range import fetch_chunk, merge_chunks, parse_duration, parse_time, split_range
+
+@pytest.mark.parametrize('value, seconds', [('30', 30), ('2.5', 2.5), ('30s', 30), ('500ms', 0.5), ('1h30m', 5400),
+                                            ('1.5h', 5400), ('7d', 604800), ('1w', 604800)])
+def test_parse_duration(value, seconds):
+    assert parse_duration(value) == seconds
+
+@pytest.mark.parametrize('value', ['', 'h', '1h30', '30 s', '1x', '-5m'])
+def test_parse_duration_rejects_malformed_values(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_duration(value)
+
+@pytest.mark.parametrize('value, seconds', [('now', 1e9), ('1700000000', 1700000000), ('1h', 1e9 - 3600),
+                                            ('2024-01-01T00:00:00Z', 1704067200),
+                                            ('2024-01-01T00:00:00', 1704067200),
+                                            ('2024-01-01T02:00:00+02:00', 1704067200)])
+def test_parse_time(value, seconds):
+    assert parse_time(value, now=1e9) == seconds
+
+def test_parse_time_rejects_garbage():
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_time('yesterday', now=1e9)
+
+def steps_of(chunks, step):
+    return np.concatenate([np.arange(a, b + step / 2, step) for a, b in chunks])
+
+def test_split_range_aligns_chunks_to_the_absolute_clock():
+    assert split_range(0, 100, 10, 4) == [(0, 30), (40, 70), (80, 100)]
+    # An unaligned start begins at the next step, the first chunk still ends on the span boundary
+    assert split_range(15, 100, 10, 4) == [(20, 30), (40, 70), (80, 100)]
+
+@pytest.mark.parametrize('start, end, step, chunk_points', [(0, 100, 10, 4), (3, 997, 7, 5), (990, 990, 30, 2),
+                                                            (0, 86400 * 7, 30, 10000), (59, 60000, 60, 3)])
+def test_split_range_covers_every_step_once(start, end, step, chunk_points):
+    chunks = split_range(start, end, step, chunk_points)
+    steps = steps_of(chunks, step)
+    expected = np.arange(np.ceil(start / step) * step, end + step / 2, step)
+    assert np.array_equal(steps, expected)
+    assert all(round((b - a) / step) + 1 <= chunk_points for a, b in chunks)
+
+def test_split_range_is_stable_when_the_start_moves():
+    # A rerun with a later relative start asks for the same chunks, except the first one, so it can resume them
+    first = split_range(0, 1000, 10, 8)
+    later = split_range(35, 1000, 10, 8)
+    assert later[1:] == first[1:]
+
+def test_split_range_without_a_step_inside():
+    assert split_range(5, 8, 10, 4) == []
+
+def write_chunk(path, series):
+    with open(path, 'w') as f:
+        json.dump(series, f)
+    return str(path)
+
+def test_merge_chunks_matches_series_by_labels_and_dedupes_boundaries(tmp_path):
+    a, b = {'job': 'x', 'instance': '1'}, {'instance': '1', 'job': 'y'}
+    first = write_chunk(tmp_path / '1.json', [{'metric': a, 'values': [[0, '1'], [10, '2']]},
+                                              {'metric': b, 'values': [[10, '5']]}])
+    second = write_chunk(tmp_path / '2.json', [{'metric': dict(reversed(list(a.items()))),
+                                                'values': [[10, '2'], [20, '3']]}])
+    merged = merge_chunks([second, first])
+    assert len(merged) == 2
+    by_job = {series['metric']['job']: series['values'] for series in merged}
+    assert by_job['x'] == [[0, '1'], [10, '2'], [20, '3']]
+    assert by_job['y'] == [[10, '5']]
+
+def test_merge_chunks_of_empty_results(tmp_path):
+    assert merge_chunks([write_chunk(tmp_path / '1.json', [])]) == []
+
+class FlakyClient:
+    def __init__(self, failures, error=ConnectionError('connection refused')):
+        self.failures = failures
+        self.error = error
+        self.calls = []
+
+    def query_range(self, query, start, end, step):
+        self.calls.append((query, start, end, step))
+        if len(self.calls) <= self.failures:
+            raise self.error
+        return [{'metric': {}, 'values': [[start, '1']]}]
+
+def test_fetch_chunk_retries_then_writes_the_result(tmp_path):
+    client = FlakyClient(failures=2)
+    path = str(tmp_path / 'chunk.json')
+    assert fetch_chunk(client, 'up', (0, 90), 30, path, retries=3, backoff=0) == (path, 2)
+    assert client.calls[-1] == ('up', 0, 90, '30s')
+    with open(path) as f:
+        assert json.load(f) == [{'metric': {}, 'values': [[0, '1']]}]
+    # A chunk a previous run finished is not fetched again
+    assert fetch_chunk(client, 'up', (0, 90), 30, path) == (path, 0)
+    assert len(client.calls) == 3
+
+def test_fetch_chunk_gives_up_after_the_retries(tmp_path):
+    client = FlakyClient(failures=10)
+    path = tmp_path / 'chunk.json'
+    with pytest.raises(ConnectionError):
+        fetch_chunk(client, 'up', (0, 90), 30, str(path), retries=2, backoff=0)
+    assert len(client.calls) == 3
+    assert not path.exists()
+
+def test_fetch_chunk_retries_server_errors(tmp_path):
+    client = FlakyClient(failures=1, error=PrometheusError('query_range failed with HTTP 503', 503, 'timeout'))
+    path = str(tmp_path / 'chunk.json')
+    assert fetch_chunk(client, 'up', (0, 90), 30, path, retries=3, backoff=0) == (path, 1)
+
+def test_fetch_chunk_fails_at_once_on_a_bad_query(tmp_path):
+    client = FlakyClient(failures=10, error=PrometheusError('query_range failed with HTTP 400', 400, 'bad_data'))
+    path = tmp_path / 'chunk.json'
+    with pytest.raises(PrometheusError):
+        fetch_chunk(client, 'up', (0, 90), 30, str(path), retries=3, backoff=0)
+    assert len(client.calls) == 1
+    assert not path.exists()
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from forecast_table import ForecastTable, grid_size
+
+PERIOD = 3600.0
+
+class SineModel:
+    """Stand-in forecaster, predict() evaluates a smooth periodic function of the timestamps it is given"""
+
+    @staticmethod
+    def curve(seconds):
+        return 10 + np.sin(2 * np.pi * seconds / PERIOD)
+
+    def predict(self, df):
+        import pandas as pd
+        seconds = np.array([ts.timestamp() for ts in df['ds']])
+        yhat = self.curve(seconds)
+        return pd.DataFrame({'ds': df['ds'], 'yhat': yhat, 'yhat_lower': yhat - 1, 'yhat_upper': yhat + 1})
+
+@pytest.mark.parametrize('step, size', [(10, 360), (7, 514), (1000, 4), (5000, 1)])
+def test_grid_size(step, size):
+    assert grid_size(PERIOD, step) == size
+
+@pytest.mark.parametrize('step, tolerance', [(10, 1e-3), (7, 1e-3), (13, 1e-3), (1000, 0.25)])
+def test_lookup_matches_the_model_when_step_does_not_divide_the_period(step, tolerance):
+    pytest.importorskip('pandas')
+    table = ForecastTable.from_model(SineModel(), PERIOD, step)
+    seconds = np.linspace(0, 3 * PERIOD, 1001)
+    yhat, lower, upper = table.lookup_many(seconds)
+    assert np.max(np.abs(yhat - SineModel.curve(seconds))) < tolerance
+    assert np.allclose(upper - lower, 2)
+    for t in seconds[::97]:
+        assert table.lookup(t)[0] == pytest.approx(SineModel.curve(t), abs=tolerance)
+
+def test_lookup_interpolates_and_wraps_around_the_period():
+    table = ForecastTable(40, [0, 10, 20, 30], [0, 0, 0, 0], [1, 1, 1, 1])
+    assert table.lookup(15)[0] == 15
+    # Past the last point it interpolates back towards the first one
+    assert table.lookup(35)[0] == 15
+    assert table.lookup(40 + 15)[0] == 15
+    assert list(table.lookup_many([15, 35, 55])[0]) == [15, 15, 15]
+
+def test_save_and_load(tmp_path):
+    table = ForecastTable(40, [0, 10, 20, 30], [-1, 9, 19, 29], [1, 11, 21, 31])
+    path = str(tmp_path / 'table.npz')
+    table.save(path)
+    loaded = ForecastTable.load(path)
+    assert loaded.period == 40
+    assert loaded.lookup(15) == table.lookup(15)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from forecasters import FORECASTERS, FourierForecaster, build_forecaster, forecaster_from_json, forecaster_to_json
+
+pd = pytest.importorskip('pandas')
+
+PARAMS = {'interval_width': 0.99, 'seasonality_period': 1 / 24, 'fourier_order': 5}
+
+def hourly_frame(start, minutes, noise=0.0, seed=0):
+    """One sample a minute of an hourly sinusoid around 100, with optional Gaussian noise"""
+    ds = pd.date_range(start, periods=minutes, freq='min')
+    seconds = (ds - pd.Timestamp('1970-01-01')).total_seconds().values
+    truth = 100 + 20 * np.sin(2 * np.pi * seconds / 3600) + 5 * np.cos(4 * np.pi * seconds / 3600)
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'ds': ds, 'y': truth + noise * rng.standard_normal(minutes)}), truth
+
+def test_fit_recovers_an_hourly_sinusoid():
+    train, _ = hourly_frame('2024-01-01', 2 * 24 * 60, noise=1.0)
+    model = FourierForecaster(**PARAMS).fit(train)
+    # Forecast a day after the training window, the seasonality repeats every hour
+    test, truth = hourly_frame('2024-01-05', 24 * 60)
+    forecast = model.predict(test)
+    assert np.max(np.abs(forecast['yhat'].values - truth)) < 0.5
+    assert np.all(forecast['yhat_lower'].values < truth)
+    assert np.all(forecast['yhat_upper'].values > truth)
+    # A 99% interval around N(0, 1) noise is about 2 * 2.58 wide
+    width = forecast['yhat_upper'].values - forecast['yhat_lower'].values
+    assert width == pytest.approx(np.full(len(width), 5.15), rel=0.15)
+
+def test_noise_free_fit_has_a_tight_interval():
+    train, truth = hourly_frame('2024-01-01', 6 * 60)
+    forecast = FourierForecaster(**PARAMS).fit(train).predict(train)
+    assert np.allclose(forecast['yhat'].values, truth)
+    assert np.allclose(forecast['yhat_upper'].values - forecast['yhat_lower'].values, 0, atol=1e-6)
+
+def test_json_round_trip():
+    train, _ = hourly_frame('2024-01-01', 6 * 60, noise=1.0)
+    model = FourierForecaster(**PARAMS).fit(train)
+    loaded = forecaster_from_json('fourier', forecaster_to_json('fourier', model))
+    pd.testing.assert_frame_equal(loaded.predict(train), model.predict(train))
+
+def test_build_forecaster_by_name():
+    model = build_forecaster('fourier', PARAMS)
+    assert isinstance(model, FourierForecaster)
+    assert (model.interval_width, model.seasonality_period, model.fourier_order) == (0.99, 1 / 24, 5)
+
+def test_build_prophet_forecaster():
+    prophet = pytest.importorskip('prophet')
+    model = build_forecaster('prophet', PARAMS)
+    assert isinstance(model, prophet.Prophet)
+    assert model.seasonalities['hourly']['fourier_order'] == 5
+
+def test_unknown_forecaster_is_rejected():
+    with pytest.raises(ValueError, match=', '.join(FORECASTERS)):
+        build_forecaster('arima', PARAMS)
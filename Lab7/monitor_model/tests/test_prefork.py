@@ -0,0 +1,29 @@
+from collections import Counter, namedtuple
+import pytest
+from prefork import shard_edges
+
+Edge = namedtuple('Edge', ['source', 'destination', 'quantile'])
+
+def edges_of(pairs, quantiles=(0.5,)):
+    return [Edge(f'src{i}', 'dst', q) for i in range(pairs) for q in quantiles]
+
+@pytest.mark.parametrize('pairs, workers', [(1, 1), (7, 3), (10, 4), (5, 5), (3, 8), (100, 7)])
+def test_every_edge_lands_in_exactly_one_balanced_shard(pairs, workers):
+    edges = edges_of(pairs)
+    shards = shard_edges(edges, workers)
+    assert len(shards) == min(workers, pairs)
+    assert Counter(edge for shard in shards for edge in shard) == Counter(edges)
+    sizes = [len(shard) for shard in shards]
+    assert max(sizes) - min(sizes) <= 1
+
+def test_quantiles_of_a_pair_share_a_shard():
+    edges = edges_of(5, quantiles=(0.5, 0.95, 0.99))
+    shards = shard_edges(edges, 2)
+    assert sorted(len(shard) for shard in shards) == [6, 9]
+    for shard in shards:
+        pairs = {(edge.source, edge.destination) for edge in shard}
+        assert len(shard) == 3 * len(pairs)
+    assert sum(len(shard) for shard in shards) == len(edges)
+
+def test_no_edges():
+    assert shard_edges([], 4) == []
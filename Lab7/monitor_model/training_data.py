@@ -0,0 +1,74 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+def file_digest(path):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest
+
+def _stream_first_values(f):
+    """Yield the flattened [timestamp, value, ...] items of the first series without building the document"""
+    for prefix, event, value in ijson.parse(f, use_float=True):
+        if prefix == 'data.result.item.values.item.item':
+            yield value
+        elif prefix == 'data.result.item.values' and event == 'end_array':
+            return
+
+def read_prometheus_series(path):
+    """Read the first series of a Prometheus query_range JSON export as float64 timestamp and value arrays"""
+    with open(path, 'rb') as f:
+        if ijson is not None:
+            flat = np.fromiter(map(float, _stream_first_values(f)), dtype=np.float64)
+        else:
+            values = _loads(f.read())['data']['result'][0]['values']
+            flat = np.fromiter((float(item) for pair in values for item in pair), dtype=np.float64,
+                               count=2 * len(values))
+    pairs = flat.reshape(-1, 2)
+    return pairs[:, 0].copy(), pairs[:, 1].copy()
+
+def save_columnar(path, timestamps, values):
+    """Atomically write timestamp and value arrays to an uncompressed .npz file"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp.{os.getpid()}.npz"
+    np.savez(tmp_path, timestamps=np.asarray(timestamps, dtype=np.float64),
+             values=np.asarray(values, dtype=np.float64))
+    os.replace(tmp_path, path)
+
+def load_columnar(path):
+    """Read timestamp and value arrays written by save_columnar"""
+    with np.load(path) as data:
+        return data['timestamps'], data['values']
+
+def load_series(path, cache_dir=None):
+    """Load a training series from a columnar file, or from a JSON export through the columnar cache"""
+    if path.endswith('.npz'):
+        return load_columnar(path)
+    if not cache_dir:
+        return read_prometheus_series(path)
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    cache_path = os.path.join(cache_dir, f"{name}-{file_digest(path).hexdigest()[:16]}.npz")
+    if os.path.exists(cache_path):
+        return load_columnar(cache_path)
+    timestamps, values = read_prometheus_series(path)
+    try:
+        save_columnar(cache_path, timestamps, values)
+    except OSError as e:
+        print(f"Could not save columnar training cache {cache_path}: {e}", flush=True)
+    return timestamps, values